@@ -0,0 +1,143 @@
+""" Mesure du chemin complet d'un ticket, du message WebSocket jusqu'aux octets écrits :
+serveur Socket.IO local -> WebSocketClient.on_update -> PrintQueue -> Printer.print -> imprimante factice.
+Fonctionne sans matériel ni écran (plateforme Qt offscreen), par exemple en intégration continue :
+
+    python benchmark_print_path.py --count 200 --latency 0.02 --failure-rate 0.01
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QCoreApplication, QTimer, Qt
+from fake_socket_server import FakeSocketServer
+from printer_device import FakeBackend, PrinterDeviceManager
+from printer_pool import PrinterPool
+from print_queue import PrintQueue
+from print_spool import PrintSpool
+from request_handler import RequestExecutor
+from websocket_client import WebSocketClient
+
+
+def percentile(values, p):
+    """ Percentile au rang le plus proche (values triées) """
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class PrintPathBenchmark:
+
+    def __init__(self, count=100, interval=0.0, latency=0.0, failure_rate=0.0, printers=1,
+                 timeout=60, seed=1):
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.sent = {}
+        self.printed = {}
+        self._lock = threading.Lock()
+
+        self.server = FakeSocketServer()
+        self.backend = FakeBackend(latency=latency, failure_rate=failure_rate, seed=seed)
+        self.request_executor = RequestExecutor()
+        self.pool = PrinterPool("http://127.0.0.1:1", self.request_executor, None)
+        for index in range(printers):
+            self.pool.add(PrinterDeviceManager(f"{index + 1:04x}", "0001", None, backend=self.backend))
+        self.spool_dir = tempfile.mkdtemp(prefix="kiosk-bench-")
+        self.spool = PrintSpool(os.path.join(self.spool_dir, "print_spool.jsonl"))
+        self.print_queue = PrintQueue(self.pool, self.spool, maxsize=max(50, count), retry_interval=0.2)
+        for worker in self.print_queue.workers:
+            # Relevé dans le thread d'impression, juste après l'écriture des octets
+            worker.job_finished.connect(self.on_job_finished, Qt.DirectConnection)
+        self.client = None
+
+    def on_job_finished(self, job_id, success):
+        if success:
+            with self._lock:
+                self.printed.setdefault(job_id, time.perf_counter())
+
+    def emit_all(self):
+        if not self.server.client_connected.wait(self.timeout):
+            return
+        for number in range(self.count):
+            job_id = f"bench-{number}"
+            payload = {'job_id': job_id, 'template': 'default',
+                       'fields': {'number': number, 'lines': ["Ticket de mesure"]}}
+            self.sent[job_id] = self.server.emit_update(payload)
+            if self.interval:
+                time.sleep(self.interval)
+
+    def run(self):
+        app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+        self.server.start()
+        self.client = WebSocketClient(self.server.url, ack_timeout=self.timeout)
+        self.client.signal_print.connect(self.print_queue.submit)
+        self.client.signal_print_batch.connect(self.print_queue.submit_batch)
+        self.print_queue.job_finished.connect(self.client.acknowledge)
+        self.print_queue.start()
+        self.client.start()
+
+        start = time.perf_counter()
+        emitter = threading.Thread(target=self.emit_all, name="bench-emitter", daemon=True)
+        emitter.start()
+
+        def check_done():
+            if len(self.printed) >= self.count or time.perf_counter() - start > self.timeout:
+                app.quit()
+        timer = QTimer()
+        timer.timeout.connect(check_done)
+        timer.start(20)
+        app.exec()
+        timer.stop()
+
+        self.client.stop()
+        self.print_queue.stop()
+        self.spool.close()
+        self.pool.stop()
+        self.server.stop()
+        self.request_executor.shutdown()
+        return self.results()
+
+    def results(self):
+        latencies = sorted(self.printed[job_id] - self.sent[job_id]
+                           for job_id in self.printed if job_id in self.sent)
+        duration = (max(self.printed.values()) - min(self.sent.values())) if latencies else None
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+        return {
+            'tickets_sent': len(self.sent),
+            'tickets_printed': len(latencies),
+            'throughput_per_s': round(len(latencies) / duration, 1) if duration else None,
+            'p50_ms': ms(percentile(latencies, 50)),
+            'p99_ms': ms(percentile(latencies, 99)),
+            'max_ms': ms(latencies[-1] if latencies else None),
+            'bytes_written': self.backend.bytes_written,
+            'acks': len(self.server.acks),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure du chemin WebSocket -> imprimante")
+    parser.add_argument('--count', type=int, default=100, help="nombre de tickets")
+    parser.add_argument('--interval', type=float, default=0.0, help="délai entre deux envois (s)")
+    parser.add_argument('--latency', type=float, default=0.0, help="latence d'écriture de l'imprimante (s)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probabilité d'échec d'une écriture")
+    parser.add_argument('--printers', type=int, default=1, help="nombre d'imprimantes factices")
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    results = PrintPathBenchmark(args.count, args.interval, args.latency, args.failure_rate,
+                                 args.printers, args.timeout).run()
+    print(json.dumps(results, indent=2))
+    # Code de sortie non nul si des tickets ne sont pas arrivés (utilisable en CI)
+    return 0 if results['tickets_printed'] == results['tickets_sent'] == args.count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
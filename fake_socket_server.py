@@ -0,0 +1,116 @@
+import time
+import asyncio
+import argparse
+import threading
+import socketio
+from aiohttp import web
+from logging_setup import get_logger
+
+logger = get_logger('socket')
+
+
+class FakeSocketServer:
+    """ Serveur Socket.IO local qui imite le canal /socket_app_patient du serveur :
+    envoi d'événements 'update' et réception des accusés de réception des bornes.
+    Tourne dans son propre thread (boucle asyncio + aiohttp) """
+
+    def __init__(self, host='127.0.0.1', port=0, namespace='/socket_app_patient'):
+        self.host = host
+        self.port = port  # 0 = port libre choisi par le système
+        self.namespace = namespace
+        self.sio = socketio.AsyncServer(async_mode='aiohttp', logger=False, engineio_logger=False)
+        self.app = web.Application()
+        self.sio.attach(self.app)
+        self.sio.on('connect', self._on_connect, namespace=namespace)
+        self.sio.on('disconnect', self._on_disconnect, namespace=namespace)
+        self.sio.on('ping_rtt', self._on_ping, namespace=namespace)
+        self.clients = set()
+        self.client_connected = threading.Event()
+        self.acks = []  # (heure de réception, accusé de réception)
+        self.seq = 0
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="fake-socket-server", daemon=True)
+        self.thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError("Le serveur Socket.IO de test n'a pas démarré")
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        runner = web.AppRunner(self.app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        self.port = runner.addresses[0][1]
+        logger.info(f"Serveur Socket.IO de test sur {self.url}")
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(runner.cleanup())
+            self.loop.close()
+
+    async def _on_connect(self, sid, environ, auth=None):
+        logger.info(f"Borne connectée : {sid} (dernier numéro reçu : {(auth or {}).get('last_seq')})")
+        self.clients.add(sid)
+        self.client_connected.set()
+
+    async def _on_disconnect(self, sid):
+        self.clients.discard(sid)
+        if not self.clients:
+            self.client_connected.clear()
+
+    async def _on_ping(self, sid, *args):
+        return 'pong'
+
+    def _on_ack(self, *args):
+        self.acks.append((time.perf_counter(), args[0] if args else None))
+
+    async def _emit(self, message):
+        # Accusé de réception demandé à chaque borne (non disponible en diffusion)
+        for sid in list(self.clients):
+            await self.sio.emit('update', message, to=sid, namespace=self.namespace, callback=self._on_ack)
+
+    def emit_update(self, payload):
+        """ Envoie un ticket aux bornes connectées (appelable depuis n'importe quel thread).
+        payload peut imposer seq (renvoi d'un ancien message, numéro invalide).
+        Retourne l'heure d'envoi (time.perf_counter) """
+        self.seq += 1
+        message = dict({'flag': 'print', 'seq': self.seq}, **payload)
+        sent_at = time.perf_counter()
+        asyncio.run_coroutine_threadsafe(self._emit(message), self.loop)
+        return sent_at
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+
+
+if __name__ == "__main__":
+    # Utilisation manuelle : une borne configurée sur cette adresse reçoit un ticket toutes les N secondes
+    parser = argparse.ArgumentParser(description="Serveur Socket.IO de test pour la borne")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--interval', type=float, default=5)
+    args = parser.parse_args()
+    server = FakeSocketServer(port=args.port)
+    server.start()
+    print(f"Serveur de test sur {server.url}")
+    number = 0
+    try:
+        while True:
+            time.sleep(args.interval)
+            if server.clients:
+                number += 1
+                server.emit_update({'job_id': f"test-{number}", 'template': 'default',
+                                    'fields': {'number': number}})
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,263 @@
+import json
+from PySide6.QtWebEngineCore import QWebEngineScript
+from logging_setup import get_logger
+
+logger = get_logger('web')
+
+# Les scripts de la borne s'exécutent dans un monde isolé : ils accèdent au DOM de la page
+# mais pas à ses variables JavaScript (et la page ne voit pas les identifiants)
+KIOSK_WORLD = QWebEngineScript.ScriptWorldId.ApplicationWorld.value
+# Monde de la page : nécessaire pour les aides utilisées par le JavaScript de la page
+MAIN_WORLD = QWebEngineScript.ScriptWorldId.MainWorld.value
+
+DOCUMENT_CREATION = QWebEngineScript.InjectionPoint.DocumentCreation
+DOCUMENT_READY = QWebEngineScript.InjectionPoint.DocumentReady
+
+
+# Bloque le pinch (zoom à plusieurs doigts), le CTRL+Scrolling reste possible
+PINCH_BLOCKER_JS = """
+document.addEventListener('touchstart', function(e) {
+    if ((e.touches.length > 1) || e.targetTouches.length > 1) {
+        e.preventDefault();
+        e.stopPropagation();
+        e.stopImmediatePropagation();
+    }
+}, {passive: false, capture: true});
+"""
+
+# Remplit et soumet le formulaire de connexion. Injecté quand le DOM est prêt :
+# plus besoin d'attendre DOMContentLoaded (qui pouvait déjà être passé)
+LOGIN_JS = """
+(function(params) {
+    if (location.href.indexOf('login') === -1) {
+        return;
+    }
+    // Une seule tentative automatique par page de connexion et par période,
+    // pour ne pas boucler si les identifiants sont refusés
+    var key = 'kioskLoginAttempt';
+    var last = parseInt(sessionStorage.getItem(key) || '0', 10);
+    if (Date.now() - last < params.retryDelayMs) {
+        console.log("Connexion automatique déjà tentée, nouvel essai plus tard");
+        return;
+    }
+    var usernameInput = document.querySelector('input[name="username"]');
+    var passwordInput = document.querySelector('input[name="password"]');
+    var rememberCheckbox = document.querySelector('input[name="remember"]');
+    if (!usernameInput || !passwordInput) {
+        console.log("Login form not found");
+        return;
+    }
+    usernameInput.value = params.username;
+    passwordInput.value = params.password;
+    if (rememberCheckbox) {
+        rememberCheckbox.checked = true;
+    }
+    var form = usernameInput.closest('form');
+    if (form) {
+        sessionStorage.setItem(key, String(Date.now()));
+        console.log("Found form, submitting");
+        form.submit();
+    }
+})(__KIOSK_PARAMS__);
+"""
+
+# Diagnostic tactile : la fonction est définie une fois par page,
+# run_touch_diagnostic() n'envoie ensuite qu'un appel court
+TOUCH_DIAGNOSTIC_JS = """
+window.__kioskTouchDiagnostic = function checkTouchSupport() {
+    let diagnosticResult = {
+        touchPoints: navigator.maxTouchPoints,
+        touchEnabled: 'ontouchstart' in window,
+        pointerEnabled: Boolean(window.PointerEvent),
+        screenTouch: 'TouchEvent' in window,
+        events: []
+    };
+
+    // Vérifier les événements tactiles disponibles
+    ['touchstart', 'touchend', 'touchmove'].forEach(eventName => {
+        let testElement = document.createElement('div');
+        let eventRegistered = false;
+
+        testElement.addEventListener(eventName, () => {
+            eventRegistered = true;
+        }, { once: true });
+
+        try {
+            // Tenter de déclencher l'événement de manière simple
+            let simpleEvent = new Event(eventName);
+            testElement.dispatchEvent(simpleEvent);
+            diagnosticResult.events.push({
+                event: eventName,
+                registered: eventRegistered,
+                supported: true
+            });
+        } catch(e) {
+            diagnosticResult.events.push({
+                event: eventName,
+                registered: false,
+                supported: false,
+                error: e.message
+            });
+        }
+    });
+
+    // Vérifier si l'écran tactile est actif via pointer events
+    let pointerTest = {
+        touch: false,
+        pen: false,
+        mouse: false
+    };
+
+    function handlePointer(e) {
+        pointerTest[e.pointerType] = true;
+    }
+
+    document.addEventListener('pointerdown', handlePointer, { once: true });
+    diagnosticResult.pointerTest = pointerTest;
+
+    // Ajouter des informations sur le viewport
+    diagnosticResult.viewport = {
+        width: window.innerWidth,
+        height: window.innerHeight,
+        devicePixelRatio: window.devicePixelRatio,
+        orientation: window.screen.orientation ?
+            window.screen.orientation.type : 'unknown'
+    };
+
+    return JSON.stringify(diagnosticResult);
+};
+"""
+
+# Latence entre un appui et l'image suivante affichée, relevée par la politique de rechargement
+INPUT_LATENCY_JS = """
+(function() {
+    var total = 0, count = 0, max = 0;
+    document.addEventListener('pointerdown', function(e) {
+        var start = e.timeStamp;
+        requestAnimationFrame(function() {
+            var latency = performance.now() - start;
+            total += latency;
+            count += 1;
+            max = Math.max(max, latency);
+        });
+    }, {passive: true, capture: true});
+    window.__kioskTakeInputLatency = function() {
+        var result = {count: count, avg: count ? total / count : 0, max: max};
+        total = 0; count = 0; max = 0;
+        return result;
+    };
+})();
+"""
+
+# Émission directe d'un ticket : window.kioskIssueTicket(bridge, données) retourne une Promise,
+# résolue avec la réponse du serveur une fois le ticket mis en impression (rejetée en cas d'erreur).
+# La page passe son propre objet bridge (un seul QWebChannel par page)
+ISSUE_TICKET_JS = """
+(function() {
+    var pending = {};
+    var counter = 0;
+    function listen(bridge) {
+        if (bridge.__kioskIssueListening) {
+            return;
+        }
+        bridge.__kioskIssueListening = true;
+        bridge.ticket_issued.connect(function(requestId, resultJson) {
+            var callbacks = pending[requestId];
+            if (!callbacks) {
+                return;
+            }
+            delete pending[requestId];
+            var result = JSON.parse(resultJson);
+            if (result.ok) {
+                callbacks.resolve(result);
+            } else {
+                callbacks.reject(result);
+            }
+        });
+    }
+    window.kioskIssueTicket = function(bridge, data) {
+        listen(bridge);
+        var requestId = Date.now() + '-' + (counter++);
+        return new Promise(function(resolve, reject) {
+            pending[requestId] = {resolve: resolve, reject: reject};
+            bridge.issue_ticket(requestId, JSON.stringify(data || {}));
+        });
+    };
+})();
+"""
+
+TOUCH_DIAGNOSTIC_CALL = "window.__kioskTouchDiagnostic ? window.__kioskTouchDiagnostic() : null"
+
+
+class KioskScript:
+    """ Script versionné injecté par Qt à chaque chargement de page.
+    Les paramètres sont sérialisés en JSON (jamais insérés tels quels dans le code) """
+
+    def __init__(self, name, version, source, injection_point, params=None, world=KIOSK_WORLD):
+        self.name = name
+        self.world = world
+        self.version = version
+        self.source = source
+        self.injection_point = injection_point
+        self.params = params
+
+    @property
+    def full_name(self):
+        return f"kiosk-{self.name}-v{self.version}"
+
+    def build(self):
+        source = self.source
+        if self.params is not None:
+            source = source.replace('__KIOSK_PARAMS__', json.dumps(self.params))
+        script = QWebEngineScript()
+        script.setName(self.full_name)
+        script.setSourceCode(source)
+        script.setInjectionPoint(self.injection_point)
+        script.setWorldId(self.world)
+        script.setRunsOnSubFrames(False)
+        return script
+
+
+class ScriptRegistry:
+    """ Enregistre les scripts de la borne dans une QWebEngineScriptCollection :
+    ils sont analysés une fois par page au lieu d'être renvoyés via runJavaScript """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.scripts = {}
+
+    def register(self, script):
+        self._remove(script.name)
+        self.scripts[script.name] = script
+        self.collection.insert(script.build())
+        logger.debug(f"Script {script.full_name} enregistré")
+
+    def update_params(self, name, params):
+        """ Nouveaux paramètres (ex : identifiants modifiés) : pris en compte au prochain chargement """
+        script = self.scripts.get(name)
+        if script is None:
+            return
+        params = dict(script.params or {}, **params)
+        if params == script.params:
+            return
+        script.params = params
+        self.register(script)
+
+    def _remove(self, name):
+        previous = self.scripts.pop(name, None)
+        if previous is None:
+            return
+        for existing in self.collection.find(previous.full_name):
+            self.collection.remove(existing)
+
+
+def default_scripts(username, password, login_retry_delay=30):
+    return [
+        KioskScript('pinch-blocker', 1, PINCH_BLOCKER_JS, DOCUMENT_CREATION),
+        KioskScript('touch-diagnostic', 1, TOUCH_DIAGNOSTIC_JS, DOCUMENT_CREATION),
+        KioskScript('input-latency', 1, INPUT_LATENCY_JS, DOCUMENT_CREATION),
+        KioskScript('issue-ticket', 1, ISSUE_TICKET_JS, DOCUMENT_CREATION, world=MAIN_WORLD),
+        KioskScript('login', 1, LOGIN_JS, DOCUMENT_READY,
+                    params={'username': username, 'password': password,
+                            'retryDelayMs': login_retry_delay * 1000}),
+    ]
@@ -0,0 +1,83 @@
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+# Un logger par composant : kiosk.app, kiosk.print, kiosk.http, kiosk.socket, kiosk.touch...
+ROOT_LOGGER = 'kiosk'
+
+_listener = None
+
+
+def get_logger(component):
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+class JsonFormatter(logging.Formatter):
+    """ Une ligne JSON par message (lisible par les outils de la flotte) """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(path='kiosk.log', level='INFO', max_bytes=5 * 1024 * 1024, backup_count=5,
+                  console=True):
+    """ Configure la journalisation de toute l'application (à appeler une seule fois).
+    Les threads (interface, WebSocket, impression) déposent les messages dans une file :
+    seul le thread du QueueListener écrit sur le disque """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                       encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    # Les librairies (socketio, engineio, urllib3...) ne remontent que les avertissements
+    root.setLevel(logging.WARNING)
+    set_level(None, level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def set_level(component, level):
+    """ Change le niveau d'un composant (ou de toute l'application si component est None),
+    à chaud, sans redémarrer """
+    name = ROOT_LOGGER if not component else f"{ROOT_LOGGER}.{component}"
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    logging.getLogger(name).setLevel(level)
+
+
+def stop_logging():
+    """ Vide la file et ferme les fichiers """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,20 +1,39 @@
 import os
 os.environ["QT_QPA_PLATFORM"] = "xcb"  # forcage de l'utilisation de X11 au lieu de Wayland. Wayland peut provoquer des gels de l'App si instabilité de la connexion avec l'écran.
 import sys
-import requests
+import json
 from PySide6.QtWidgets import (QApplication, QMainWindow, QMenu, QVBoxLayout,
                                 QLineEdit, QPushButton, QDialog, QFormLayout,
                                 QMenuBar, QMessageBox, QCheckBox, QLabel)
 from PySide6.QtWebEngineWidgets import QWebEngineView 
 from PySide6.QtWebEngineCore import QWebEnginePage
-from PySide6.QtCore import Qt, QSettings, Signal, QTimer, QEvent, Slot
+from PySide6.QtCore import Qt, Signal, QTimer, QEvent, Slot
 from PySide6.QtGui import QAction
 from PySide6.QtWebChannel import QWebChannel
 from datetime import datetime
-import logging
 
-from print_functions import Printer, Bridge
-from websocket_client import WebSocketClient
+from print_functions import Bridge
+from ticket_templates import TicketTemplateEngine
+from print_queue import PrintQueue
+from print_spool import PrintSpool
+from printer_device import PrinterDeviceManager, NetworkDeviceManager, parse_network_printers
+from printer_pool import PrinterPool
+from socket_manager import SocketConnectionManager
+from settings_store import SettingsStore
+from touch_telemetry import TouchTelemetry
+from logging_setup import get_logger, set_level, setup_logging
+from metrics import registry, MetricsServer, EventLoopLagProbe
+from stall_detector import StallDetector
+from web_profile import create_kiosk_profile, AssetPrefetcher
+from reload_policy import ReloadPolicy
+from kiosk_scripts import (ScriptRegistry, default_scripts, KIOSK_WORLD,
+                           TOUCH_DIAGNOSTIC_CALL)
+from request_handler import RequestExecutor
+from startup import StartupPipeline
+
+logger = get_logger('app')
+web_logger = get_logger('web')
+touch_logger = get_logger('touch')
 
 
 def resource_path(relative_path):
@@ -29,18 +48,12 @@ def resource_path(relative_path):
 
 
 class CustomWebEnginePage(QWebEnginePage):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        # Configuration des logs
-        logging.basicConfig(
-            filename='touch_events.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(message)s'
-        )
+    def __init__(self, profile, parent=None):
+        super().__init__(profile, parent)
 
     def javaScriptConsoleMessage(self, level, message, lineNumber, sourceID):
-        # Afficher le message de la console JavaScript dans la console Python
-        print(f"JS Console ({level}): {message} (Source: {sourceID}, Line: {lineNumber})")
+        # Afficher le message de la console JavaScript dans les logs
+        web_logger.debug(f"JS Console ({level}): {message} (Source: {sourceID}, Line: {lineNumber})")
     
     def acceptNavigationRequest(self, url, type, isMainFrame):
         # Empêcher la navigation par clic droit -> "Ouvrir dans un nouvel onglet"
@@ -51,15 +64,45 @@ class CustomWebEnginePage(QWebEnginePage):
         return None
         
 
+PAGE_RELOADS = registry.counter('kiosk_page_reloads_total', "Rechargements de la page")
+PAGE_RELOAD_FAILURES = registry.counter('kiosk_page_reload_failures_total',
+                                        "Rechargements abandonnés (page de réserve en échec)")
+
+# Types d'événements tactiles Qt -> code compact utilisé par la télémétrie
+TOUCH_EVENT_KINDS = {QEvent.TouchBegin: 0, QEvent.TouchUpdate: 1, QEvent.TouchEnd: 2}
+
+# Délais (secondes) entre deux demandes du token quand le serveur ne répond pas
+TOKEN_RETRY_MIN = 5
+TOKEN_RETRY_MAX = 300
+
+# Préférences dont la modification reconstruit un sous-système
+PRINTER_KEYS = {'idVendor', 'idProduct', 'printer', 'network_printers',
+                'pharmacy_name', 'ticket_header', 'ticket_footer', 'ticket_logo',
+                'ticket_encoding', 'ticket_codepage'}
+SOCKET_KEYS = {'web_url', 'websocket_enabled', 'raw_print_enabled'}
+BRIDGE_KEYS = {'web_url', 'ticket_issue_path', 'raw_print_enabled'}
+RESTART_KEYS = {'metrics_port', 'stall_threshold_ms', 'reload_mode', 'cache_policy', 'cache_size_mb',
+                'cache_prefetch', 'cache_prefetch_urls', 'reload_max_rss_mb', 'reload_max_js_heap_mb',
+                'reload_max_cpu_percent', 'reload_max_input_latency_ms', 'reload_patient_limit',
+                'reload_idle_seconds'}
+
+
 class CustomWebEngineView(QWebEngineView):
     touch_event_detected = Signal()
     touch_test_failed = Signal()
+    page_swapped = Signal()
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setContextMenuPolicy(Qt.NoContextMenu)
+
+        # Rechargement en double tampon (voir reload_page) : page_factory crée une nouvelle page
+        # du même profil, web_channel est partagé entre l'ancienne et la nouvelle page
+        self.double_buffered_reload = True
+        self.page_factory = None
+        self.web_channel = None
+        self._standby_page = None
         
-        self.last_touch_time = datetime.now()
         self.consecutive_no_touch = 0
         self.touch_check_interval = 10
         
@@ -67,39 +110,36 @@ class CustomWebEngineView(QWebEngineView):
         self.touch_timer.timeout.connect(self.check_touch_status)
         self.touch_timer.start(self.touch_check_interval * 1000)
         
-        self.touch_count = 0
-        self.last_touch_positions = []
+        # Télémétrie tactile : tampon circulaire + résumé périodique (pas d'écriture par événement)
+        self.touch_telemetry = TouchTelemetry()
+        self.touch_telemetry.start()
     
+    @property
+    def touch_count(self):
+        return self.touch_telemetry.total
+
     def contextMenuEvent(self, event):
         event.ignore()
 
     def event(self, event):
-        if event.type() in [QEvent.TouchBegin, QEvent.TouchUpdate, QEvent.TouchEnd]:
+        if event.type() in TOUCH_EVENT_KINDS:
             self.handle_touch_event(event)
         return super().event(event)
     
     def handle_touch_event(self, event):
-        self.last_touch_time = datetime.now()
-        self.touch_event_detected.emit()
+        kind = TOUCH_EVENT_KINDS[event.type()]
         self.consecutive_no_touch = 0
-        self.touch_count += 1
-        
-        if event.type() == QEvent.TouchBegin and hasattr(event, 'touchPoints'):
-            pos = event.touchPoints()[0].pos()
-            self.last_touch_positions.append((pos.x(), pos.y()))
-            if len(self.last_touch_positions) > 10:
-                self.last_touch_positions.pop(0)
-        
-        logging.info(f"Événement tactile détecté - Type: {event.type()} - Count: {self.touch_count}")
+        self.touch_telemetry.record(kind)
+        if kind == 0:
+            self.touch_event_detected.emit()
     
     def check_touch_status(self):
         """Vérifier l'état des événements tactiles"""
-        time_since_last_touch = (datetime.now() - self.last_touch_time).total_seconds()
-        print("TOUCHE")
+        time_since_last_touch = self.touch_telemetry.seconds_since_last_touch()
 
         if time_since_last_touch > self.touch_check_interval:
             self.consecutive_no_touch += 1
-            logging.warning(f"Pas d'événement tactile depuis {time_since_last_touch:.1f} secondes")
+            touch_logger.warning(f"Pas d'événement tactile depuis {time_since_last_touch:.1f} secondes")
             
             # Réduire la sensibilité du diagnostic
             if self.consecutive_no_touch >= 3:  # 3 périodes sans activité
@@ -108,86 +148,20 @@ class CustomWebEngineView(QWebEngineView):
                 if 8 <= current_hour <= 20:  # Entre 8h et 20h
                     self.run_touch_diagnostic()
                 else:
-                    logging.info("Période d'inactivité normale - Diagnostic ignoré")
+                    touch_logger.info("Période d'inactivité normale - Diagnostic ignoré")
         else:
             self.consecutive_no_touch = 0
     
     def run_touch_diagnostic(self):
         """Exécuter un diagnostic du système tactile"""
-        logging.warning("Démarrage du diagnostic tactile")
-        
-        js_diagnostic = """
-        (function checkTouchSupport() {
-            let diagnosticResult = {
-                touchPoints: navigator.maxTouchPoints,
-                touchEnabled: 'ontouchstart' in window,
-                pointerEnabled: Boolean(window.PointerEvent),
-                screenTouch: 'TouchEvent' in window,
-                events: []
-            };
-            
-            // Vérifier les événements tactiles disponibles
-            ['touchstart', 'touchend', 'touchmove'].forEach(eventName => {
-                let testElement = document.createElement('div');
-                let eventRegistered = false;
-                
-                testElement.addEventListener(eventName, () => {
-                    eventRegistered = true;
-                }, { once: true });
-                
-                try {
-                    // Tenter de déclencher l'événement de manière simple
-                    let simpleEvent = new Event(eventName);
-                    testElement.dispatchEvent(simpleEvent);
-                    diagnosticResult.events.push({
-                        event: eventName,
-                        registered: eventRegistered,
-                        supported: true
-                    });
-                } catch(e) {
-                    diagnosticResult.events.push({
-                        event: eventName,
-                        registered: false,
-                        supported: false,
-                        error: e.message
-                    });
-                }
-            });
-            
-            // Vérifier si l'écran tactile est actif via pointer events
-            let pointerTest = {
-                touch: false,
-                pen: false,
-                mouse: false
-            };
-            
-            function handlePointer(e) {
-                pointerTest[e.pointerType] = true;
-            }
-            
-            document.addEventListener('pointerdown', handlePointer, { once: true });
-            diagnosticResult.pointerTest = pointerTest;
-            
-            // Ajouter des informations sur le viewport
-            diagnosticResult.viewport = {
-                width: window.innerWidth,
-                height: window.innerHeight,
-                devicePixelRatio: window.devicePixelRatio,
-                orientation: window.screen.orientation ? 
-                    window.screen.orientation.type : 'unknown'
-            };
-            
-            return JSON.stringify(diagnosticResult);
-        })();
-        """
+        touch_logger.warning("Démarrage du diagnostic tactile")
         
         def callback(result):
             try:
                 if isinstance(result, str):
-                    import json
                     result = json.loads(result)
                 
-                logging.info(f"Résultat diagnostic : {result}")
+                touch_logger.info(f"Résultat diagnostic : {result}")
                 
                 touch_available = (
                     result.get('touchEnabled', False) or
@@ -200,31 +174,35 @@ class CustomWebEngineView(QWebEngineView):
                 
                 if not touch_available:
                     self.touch_test_failed.emit()
-                    logging.error("Diagnostic tactile échoué - Support tactile non détecté")
+                    touch_logger.error("Diagnostic tactile échoué - Support tactile non détecté")
                     need_reload = True
                 else:
                     events_working = any(e.get('registered', False) for e in result.get('events', []))
                     if not events_working:
                         self.touch_test_failed.emit()
-                        logging.error("Diagnostic tactile échoué - Événements tactiles non fonctionnels")
+                        touch_logger.error("Diagnostic tactile échoué - Événements tactiles non fonctionnels")
                         need_reload = True
                     else:
-                        logging.info("Diagnostic tactile réussi - Système tactile opérationnel")
+                        touch_logger.info("Diagnostic tactile réussi - Système tactile opérationnel")
                 
                 if need_reload:
                     self.schedule_reload()
                 
             except Exception as e:
-                logging.error(f"Erreur lors du traitement du diagnostic : {e}")
-                self.reload()
+                touch_logger.error(f"Erreur lors du traitement du diagnostic : {e}")
+                self.reload_page()
         
-        # Utilisation correcte de runJavaScript avec PySide6
-        self.page().runJavaScript(js_diagnostic, 0, callback)
+        # Le diagnostic est enregistré dans la page (kiosk_scripts) : seul l'appel est envoyé
+        self.page().runJavaScript(TOUCH_DIAGNOSTIC_CALL, KIOSK_WORLD, callback)
     
     @Slot()  # Ajout du décorateur Slot
     def schedule_reload(self):
         """Planifier le rechargement avec notification"""
-        logging.warning("Planification du rechargement automatique")
+        touch_logger.warning("Planification du rechargement automatique")
+        if self.double_buffered_reload and self.page_factory is not None:
+            # Rechargement invisible pour le patient : pas besoin de le prévenir
+            self.reload_page()
+            return
         js_notification = """
         (function() {
             let notif = document.createElement('div');
@@ -246,12 +224,49 @@ class CustomWebEngineView(QWebEngineView):
         })();
         """
         self.page().runJavaScript(js_notification)
-        QTimer.singleShot(3000, self.reload)
+        QTimer.singleShot(3000, self.reload_page)
+
+    @Slot()
+    def reload_page(self):
+        """ Rechargement de la page. En mode double tampon, une page de réserve est chargée
+        hors écran puis échangée avec la page affichée une fois prête : aucun écran blanc,
+        et en cas d'échec la page actuelle reste en place """
+        if not self.double_buffered_reload or self.page_factory is None:
+            PAGE_RELOADS.inc()
+            self.reload()
+            return
+        if self._standby_page is not None:
+            web_logger.info("Rechargement déjà en cours, demande ignorée")
+            return
+        web_logger.info("Chargement de la page de réserve")
+        self._standby_page = self.page_factory()
+        if self.web_channel is not None:
+            self._standby_page.setWebChannel(self.web_channel)
+        self._standby_page.loadFinished.connect(self._on_standby_loaded)
+        self._standby_page.setUrl(self.url())
+
+    def _on_standby_loaded(self, ok):
+        standby, self._standby_page = self._standby_page, None
+        if standby is None:
+            return
+        standby.loadFinished.disconnect(self._on_standby_loaded)
+        if not ok:
+            web_logger.warning("Échec du chargement de la page de réserve, la page actuelle est conservée")
+            PAGE_RELOAD_FAILURES.inc()
+            standby.deleteLater()
+            return
+        old_page = self.page()
+        self.setPage(standby)
+        old_page.deleteLater()
+        PAGE_RELOADS.inc()
+        web_logger.info("Page rechargée (échange avec la page de réserve)")
+        self.page_swapped.emit()
 
 
 class PreferencesDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, settings_store, parent=None):
         super().__init__(parent)
+        self.settings_store = settings_store
         self.setWindowTitle("Préférences")
 
         self.main_layout = QVBoxLayout(self)
@@ -285,6 +300,10 @@ class PreferencesDialog(QDialog):
         self.printer_model_input = QLineEdit(self)
         form_layout.addRow("Imprimante - Modèle:", self.printer_model_input)
 
+        self.network_printers_input = QLineEdit(self)
+        self.network_printers_input.setPlaceholderText("192.168.1.50:9100, 192.168.1.51")
+        form_layout.addRow("Imprimantes réseau:", self.network_printers_input)
+
         # Ajout du switch pour activer/désactiver le WebSocket
         self.websocket_checkbox = QCheckBox("Activer le WebSocket", self)
         form_layout.addRow(self.websocket_checkbox)
@@ -304,34 +323,27 @@ class PreferencesDialog(QDialog):
 
     def load_preferences(self):
         """ chargement des préférences"""
-        settings = QSettings()
-        use_password = settings.value("use_password", False, type=bool)
+        settings = self.settings_store
+        use_password = settings["use_password"]
         self.use_password_checkbox.setChecked(use_password)
-        self.secret_input.setText(settings.value("unlockpass", ""))
+        self.secret_input.setText(settings["unlockpass"])
         self.secret_input.setEnabled(use_password)
         self.secret_label.setEnabled(use_password)
-        self.web_url_input.setText(settings.value("web_url", "http://localhost:5000"))
-        self.username_input.setText(settings.value("username", "admin"))
-        self.password_input.setText(settings.value("password", "admin"))
-        self.idVendor_input.setText(settings.value("idVendor", ""))
-        self.idProduct_input.setText(settings.value("idProduct", ""))
-        self.printer_model_input.setText(settings.value("printer", ""))
-        websocket_enabled = settings.value("websocket_enabled", True, type=bool)
-        self.websocket_checkbox.setChecked(websocket_enabled)        
+        self.web_url_input.setText(settings["web_url"])
+        self.username_input.setText(settings["username"])
+        self.password_input.setText(settings["password"])
+        self.idVendor_input.setText(settings["idVendor"])
+        self.idProduct_input.setText(settings["idProduct"])
+        self.printer_model_input.setText(settings["printer"])
+        self.network_printers_input.setText(settings["network_printers"])
+        self.websocket_checkbox.setChecked(settings["websocket_enabled"])
 
 
     def save_preferences(self):
         """ sauvegarde des préférences"""
-        settings = QSettings()
         url = self.web_url_input.text()
         use_password = self.use_password_checkbox.isChecked()
         secret = self.secret_input.text()
-        username = self.username_input.text()
-        password = self.password_input.text()
-        idVendor = self.idVendor_input.text()
-        idProduct = self.idProduct_input.text()
-        printer = self.printer_model_input.text()
-        websocket_enabled = self.websocket_checkbox.isChecked()
 
         if not url:
             QMessageBox.warning(self, "Erreur", "L'URL ne peut pas être vide")
@@ -339,60 +351,105 @@ class PreferencesDialog(QDialog):
         if not secret and use_password:
             QMessageBox.warning(self, "Erreur", "Le mot de passe ne peut pas être vide")
             return
-        
-        settings.setValue("web_url", url)        
-        settings.setValue("username", username)
-        settings.setValue("password", password)
-        settings.setValue("use_password", use_password)
-        settings.setValue("unlockpass", secret)
-        settings.setValue("idVendor", idVendor)
-        settings.setValue("idProduct", idProduct)
-        settings.setValue("printer", printer)
-        settings.setValue("websocket_enabled", websocket_enabled)
+
+        # Seules les clés modifiées sont signalées : chaque sous-système concerné
+        # se met à jour de lui-même (voir MainWindow.on_settings_changed)
+        self.settings_store.update({
+            "web_url": url,
+            "username": self.username_input.text(),
+            "password": self.password_input.text(),
+            "use_password": use_password,
+            "unlockpass": secret,
+            "idVendor": self.idVendor_input.text(),
+            "idProduct": self.idProduct_input.text(),
+            "printer": self.printer_model_input.text(),
+            "network_printers": self.network_printers_input.text(),
+            "websocket_enabled": self.websocket_checkbox.isChecked(),
+        })
 
         self.accept()
-        
-        # rechargement des préférences pour être appliquées immédiatement
-        self.parent().load_preferences()
-        # Redémarrage de la connexion WebSocket en fonction de la nouvelle préférence
-        self.parent().update_socket_io_connection()
 
     def get_secret_sequence(self):
         return self.secret_input.text()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, settings_store):
         super().__init__()
 
+        # Préférences lues une fois au lancement, puis mises à jour clé par clé
+        self.settings_store = settings_store
+        self.settings_store.changes_applied.connect(self.on_settings_changed)
+        self.settings_store.watch()
         self.load_preferences()
 
-        # Mettre à jour la connexion WebSocket
-        self.update_socket_io_connection()
+        # Démarrage par phases concurrentes, chronométrées dans startup_timing.log
+        self.startup = StartupPipeline()
 
-        self.app_token = None
-        try:
-            self.get_app_token()
-            # si on a un token, on se considère comme connecté
-            self.connected = True
-            #self.loading_screen.update_last_line(" - OK ! Token obtenu")
-        except Exception as e:
-            print("Erreur lors de l'obtention du token :", e)
-            self.connected = False
-            #self.loading_screen.update_last_line(f"- Erreur : {e}")
-
-        self.session = requests.Session()  # Session HTTP persistante
-        
-        self.printer = Printer(self.idVendor, self.idProduct, self.printer_model, self.web_url,self.session, self.app_token)
-        # Créez le bridge et passez l'objet imprimante
-        self.bridge = Bridge(self.printer)
+        # Exécuteur HTTP partagé (pool de threads, connexions keep-alive, délais maximaux)
+        self.request_executor = RequestExecutor()
+        self.session = self.request_executor.session
 
+        self.app_token = None
+        self.connected = False
+        # Token redemandé en arrière-plan, avec un délai croissant, tant qu'il n'est pas obtenu
+        self._token_request = 0  # numéro de la dernière demande (les réponses périmées sont ignorées)
+        self._token_retry_delay = TOKEN_RETRY_MIN
+        self._token_timer = QTimer(self)
+        self._token_timer.setSingleShot(True)
+        self._token_timer.timeout.connect(self.request_app_token)
+        self._retired_printers = []  # anciennes files et pools en cours d'arrêt (rebuild_printers)
+        # Supervision (voir setup_metrics) : créés une fois la fenêtre construite
+        self.metrics_server = None
+        self.stall_detector = None
+
+        # File d'impression : les tickets sont imprimés hors du thread de l'interface
+        self.print_spool = PrintSpool()
+        self.setup_printers()
+        # Connexion WebSocket unique, reconfigurée à chaque enregistrement des préférences
+        self.socket_manager = SocketConnectionManager()
+        self.socket_manager.signal_print.connect(self.print_ticket)
+        self.socket_manager.signal_print_batch.connect(self.print_batch)
+        self.socket_manager.connected.connect(lambda: self.startup.end_phase("socket_connect"))
+        # Créez le bridge et passez la file d'impression
+        self.bridge = Bridge(self.print_queue, self.request_executor, self.ticket_issue_url,
+                             raw_enabled=self.print_capabilities['raw'])
+
+        # La page est chargée immédiatement, sans attendre le serveur ni l'imprimante
+        # Profil persistant : cache HTTP disque, les rechargements sont servis localement
+        # (rattaché à l'application : il doit survivre aux pages qui l'utilisent)
+        self.profile = create_kiosk_profile(QApplication.instance(), self.cache_policy, self.cache_size_mb)
         self.web_view = CustomWebEngineView()
-        self.page = CustomWebEnginePage()
-        self.web_view.setPage(self.page)
-
+        self.web_view.setPage(self.create_page())
+        self.web_view.page_factory = self.create_page
+        self.web_view.double_buffered_reload = self.reload_mode == "swap"
+        # Scripts de la borne (anti-pinch, connexion auto, diagnostic tactile) injectés par Qt
+        # dans toutes les pages du profil
+        self.scripts = ScriptRegistry(self.profile.scripts())
+        for script in default_scripts(self.username, self.password):
+            self.scripts.register(script)
+        # Rechargement décidé par l'état du moteur de rendu et le nombre de patients,
+        # pendant un temps mort uniquement
+        self.reload_policy = ReloadPolicy(self.web_view, **self.reload_thresholds)
+        self.reload_policy.reload_planned.connect(lambda reason: self.web_view.reload_page())
+        self.web_view.page_swapped.connect(self.reload_policy.on_page_reloaded)
+
+        self.startup.start_phase("web_view_load")
+        self.web_view.loadFinished.connect(
+            lambda ok: self.startup.end_phase("web_view_load", ok))
         url = self.web_url + "/patient"
         self.web_view.setUrl(url)
         self.setCentralWidget(self.web_view)
+        if self.cache_prefetch:
+            # Préchauffage optionnel du cache, une fois la page affichée
+            self.asset_prefetcher = AssetPrefetcher(self.profile, url, self.cache_prefetch_urls)
+            self.startup.finished.connect(lambda record: self.asset_prefetcher.start())
+
+        # Token, imprimante et WebSocket en parallèle
+        self.request_app_token()
+        self.start_printers()
+        self.update_socket_io_connection()
+        # Métriques et détection des blocages : imprimantes, file et WebSocket existent
+        self.setup_metrics()
 
         # Assurez-vous que le bridge a une référence à web_view
         self.bridge.web_view = self.web_view
@@ -400,13 +457,12 @@ class MainWindow(QMainWindow):
         # Configurez le WebChannel
         self.channel = QWebChannel()
         self.channel.registerObject('bridge', self.bridge)  
-        self.web_view.page().setWebChannel(self.channel)  
+        self.web_view.page().setWebChannel(self.channel)
+        self.web_view.web_channel = self.channel  
 
         # Connect to the URL changed signal. On recherche la page login pour la remplir
         self.web_view.urlChanged.connect(self.on_url_changed)
 
-        # Connecter le signal loadFinished pour injecter les balises <meta> (bloquer le pinch)
-        self.web_view.loadFinished.connect(self.inject_meta_tags)
 
         # Connecter le signal d'échec tactile
         self.web_view.touch_test_failed.connect(self.handle_touch_failure)
@@ -418,7 +474,7 @@ class MainWindow(QMainWindow):
         self.typed_sequence = ""
 
         # Create Preferences Dialog
-        self.preferences_dialog = PreferencesDialog(self)
+        self.preferences_dialog = PreferencesDialog(self.settings_store, self)
         self.preferences_dialog.load_preferences()
 
         # Create Menu
@@ -438,126 +494,257 @@ class MainWindow(QMainWindow):
 
         self.menu_bar.hide()  # Hide the menu bar initially 
 
-    def inject_meta_tags(self):
-        """ Permet de bloquer le pinch sur la page web, mais CTRL+Scrolling """
-        js_code = """document.body.addEventListener('touchstart', function(e) {
-            if ( (e.touches.length > 1) || e.targetTouches.length > 1) {
-            e.preventDefault();
-            e.stopPropagation();
-            e.stopImmediatePropagation();
-            }
-            }, {passive: false});
-        """
-        self.web_view.page().runJavaScript(js_code)
-
+    def setup_metrics(self):
+        telemetry = self.web_view.touch_telemetry
+        registry.gauge('kiosk_touch_events_total', "Événements tactiles depuis le démarrage",
+                       fn=lambda: telemetry.total)
+        registry.gauge('kiosk_touch_events_per_minute', "Événements tactiles par minute (dernier intervalle)",
+                       fn=lambda: telemetry.last_summary and telemetry.last_summary['events_per_second'] * 60)
+        registry.gauge('kiosk_last_touch_age_seconds', "Temps écoulé depuis le dernier appui",
+                       fn=lambda: round(telemetry.seconds_since_last_touch(), 1))
+        registry.gauge('kiosk_print_queue_size', "Tickets en attente dans la file d'impression",
+                       fn=lambda: self.print_queue.jobs.qsize())
+        registry.gauge('kiosk_socket_connected', "WebSocket connecté (1) ou non (0)",
+                       fn=lambda: int(self.socket_state() == 'connected'))
+
+        registry.add_health_check('printer', lambda: (not self.printer_pool.error,
+                                                      f"{len(self.printer_pool.available_printers())}"
+                                                      f"/{len(self.printer_pool.printers)} disponible(s)"))
+        registry.add_health_check('socket', lambda: (not self.websocket_enabled or self.socket_state() == 'connected',
+                                                     self.socket_state()))
+        registry.add_health_check('event_loop', lambda: (self.lag_probe.lag.value < 5,
+                                                         f"retard {self.lag_probe.lag.value} s"))
+
+        self.lag_probe = EventLoopLagProbe()
+        self.lag_probe.start()
+        # Détection des blocages de l'interface, avec la pile de l'appel bloquant
+        if self.stall_threshold_ms:
+            self.stall_detector = StallDetector(self.stall_threshold_ms / 1000)
+            self.stall_detector.start()
+        if self.metrics_port:
+            self.metrics_server = MetricsServer(port=self.metrics_port)
+            self.metrics_server.start()
+
+    def socket_state(self):
+        return self.socket_manager.state
+
+    def create_page(self):
+        """ Nouvelle page du profil de la borne (page initiale et pages de réserve) """
+        return CustomWebEnginePage(self.profile, self.web_view)
 
-            
     def handle_console_message(self, level, message, line_number, source_id):
-            print(f"JavaScript console ({level}): {message} (line {line_number}, source {source_id})")
+            web_logger.debug(f"JavaScript console ({level}): {message} (line {line_number}, source {source_id})")
+
 
+    def request_app_token(self):
+        """ Demande du token hors du thread de l'interface (au démarrage, après un échec
+        ou un changement d'URL du serveur) """
+        self._token_timer.stop()
+        self._token_request += 1
+        request, web_url = self._token_request, self.web_url
+        self.startup.run_in_thread("app_token", lambda: self.get_app_token(web_url),
+                                   on_result=lambda token: self.on_app_token(token, request))
 
-    def get_app_token(self):
-        url = f'{self.web_url}/api/get_app_token'
+    def get_app_token(self, web_url):
+        """ Requête du token (bloquante : exécutée hors du thread de l'interface) """
+        url = f'{web_url}/api/get_app_token'
         data = {'app_secret': 'votre_secret_app'}
-        response = self.session.post(url, data=data)
+        response = self.request_executor.post(url, data=data, retries=2).result()
         if response.status_code == 200:
-            self.app_token = response.json()['token']
-            print("Token obtenu :", self.app_token)
-        else:
-            print("Échec de l'obtention du token")
+            return response.json()['token']
+        logger.error("Échec de l'obtention du token")
+        return None
+
+    def on_app_token(self, token, request=None):
+        """ Réception du token dans le thread de l'interface """
+        if request is not None and request != self._token_request:
+            return  # réponse à une demande remplacée (URL du serveur modifiée entre-temps)
+        if not token:
+            # Serveur lent ou injoignable : sans token, ni état d'imprimante ni émission de ticket
+            logger.warning(f"Token non obtenu, nouvel essai dans {self._token_retry_delay} s")
+            self._token_timer.start(self._token_retry_delay * 1000)
+            self._token_retry_delay = min(self._token_retry_delay * 2, TOKEN_RETRY_MAX)
+            return
+        self._token_retry_delay = TOKEN_RETRY_MIN
+        self.app_token = token
+        # si on a un token, on se considère comme connecté
+        self.connected = True
+        logger.info("Token obtenu")
+        self.printer_pool.set_app_token(token)
+        self.bridge.app_token = token
+        self.update_socket_io_connection()
         
-    def start_socket_io_client(self, url):
-        """Démarrage de socket.io client"""
-        print(f"Starting Socket.IO client with URL: {url}")
-        self.socket_io_client = WebSocketClient(url)
-        self.socket_io_client.signal_print.connect(self.print_ticket)
-        self.socket_io_client.start()
-
-    def stop_socket_io_client(self):
-        """Arrêt de socket.io client"""
-        if hasattr(self, 'socket_io_client'):
-            print("Arrêt du client Socket.IO")
-            self.socket_io_client.stop()
-            # La méthode stop s'occupe maintenant de tout le nettoyage nécessaire
-            print("Client Socket.IO arrêté avec succès")
+    def setup_printers(self):
+        """ Pool d'imprimantes (USB et réseau) ouvertes à la demande et reconnectées
+        automatiquement, et file d'impression partagée """
+        self.ticket_templates = TicketTemplateEngine(self.ticket_header, self.ticket_footer,
+                                                     self.ticket_encoding, self.ticket_codepage,
+                                                     logo_path=self.ticket_logo)
+        self.printer_pool = PrinterPool(self.web_url, self.request_executor, self.app_token,
+                                        self.ticket_templates)
+        if (self.idVendor and self.idProduct) or not self.network_printers:
+            self.printer_pool.add(PrinterDeviceManager(self.idVendor, self.idProduct, self.printer_model))
+        for host, port in self.network_printers:
+            self.printer_pool.add(NetworkDeviceManager(host, port, self.printer_model))
+        self.print_queue = PrintQueue(self.printer_pool, self.print_spool)
+        self.print_queue.job_finished.connect(self.on_print_job_finished)
+        self.print_queue.job_abandoned.connect(self.on_print_job_abandoned)
+
+    def start_printers(self, held=()):
+        self.startup.run_in_thread("printer_init", self.printer_pool.initialize)
+        self.print_queue.start(held)
+        self.printer_pool.start_watching()
+
+    def rebuild_printers(self):
+        """ Imprimantes ou tickets modifiés : les tickets en attente restent dans le spool
+        et sont repris par la nouvelle file. L'ancienne file est arrêtée sans bloquer l'interface :
+        les tickets qu'elle imprime encore ne sont repris qu'une fois ses threads terminés """
+        logger.info("Reconfiguration des imprimantes")
+        old_queue, old_pool = self.print_queue, self.printer_pool
+        old_queue.stop(timeout_ms=0)
+        held = old_queue.in_flight()
+        self.setup_printers()
+        self.bridge.print_queue = self.print_queue
+        self.start_printers(held)
+        self._retired_printers.append((old_queue, old_pool))
+        self._retire_printers(old_queue, old_pool, held)
+
+    def _retire_printers(self, old_queue, old_pool, held, pool_stopping=False):
+        """ Libère l'ancienne file puis l'ancien pool une fois leurs threads terminés
+        (vérifié périodiquement, sans attente dans le thread de l'interface) """
+        if not old_queue.stopped():
+            QTimer.singleShot(200, lambda: self._retire_printers(old_queue, old_pool, held))
+            return
+        if not pool_stopping:
+            # Tickets en cours au moment de l'arrêt : réimprimés s'ils n'ont pas abouti
+            self.print_queue.adopt(held)
+            old_pool.stop(timeout_ms=0)
+        if not old_pool.stopped():
+            QTimer.singleShot(200, lambda: self._retire_printers(old_queue, old_pool, held, True))
+            return
+        self._retired_printers.remove((old_queue, old_pool))
+        logger.info("Anciennes imprimantes libérées")
 
-    def update_socket_io_connection(self):
-        """Démarre ou arrête le client SocketIO en fonction des préférences."""
-        if self.websocket_enabled:
-            self.start_socket_io_client(self.web_url)
-        else:
-            self.stop_socket_io_client()  
+    def on_settings_changed(self, keys):
+        """ Préférences modifiées (dialogue ou fichier) : seuls les sous-systèmes concernés
+        sont reconstruits """
+        keys = set(keys)
+        self.load_preferences()
+        if keys & PRINTER_KEYS:
+            self.rebuild_printers()
+        elif 'web_url' in keys:
+            self.printer_pool.status_reporter.web_url = self.web_url
+        if 'web_url' in keys:
+            self.web_view.setUrl(self.web_url + "/patient")
+            # Le token est propre au serveur : redemandé au nouveau
+            self._token_retry_delay = TOKEN_RETRY_MIN
+            self.request_app_token()
+        if keys & SOCKET_KEYS:
+            self.update_socket_io_connection()
+        if keys & BRIDGE_KEYS:
+            self.bridge.issue_url = self.ticket_issue_url
+            self.bridge.raw_enabled = self.print_capabilities['raw']
+        if keys & RESTART_KEYS:
+            logger.info(f"Pris en compte au prochain démarrage : {', '.join(sorted(keys & RESTART_KEYS))}")
 
-    def print_ticket(self, message):
-        """ Impression du ticket """
-        if self.printer.print(message):
-            print("Ticket imprimé avec succès.")
+    def update_socket_io_connection(self):
+        """ Applique les préférences WebSocket : le gestionnaire ne reconnecte que si l'URL
+        ou l'activation ont changé, et ne garde jamais plus d'un client """
+        if self.socket_manager.configure(self.web_url, self.websocket_enabled, self.app_token,
+                                         self.print_capabilities):
+            self.startup.start_phase("socket_connect")
+
+    def print_ticket(self, message, job_id=""):
+        """ Mise en file du ticket, imprimé par le thread d'impression """
+        self.print_queue.submit(message, job_id or None)
+
+    def print_batch(self, jobs):
+        """ Lot de tickets reçu en un message : imprimé en une seule écriture """
+        self.print_queue.submit_batch(jobs)
+
+    def on_print_job_finished(self, job_id, success):
+        """ Résultat d'un ticket, reçu depuis le thread d'impression """
+        if success:
+            logger.info(f"Ticket {job_id} imprimé avec succès.")
+            # Un ticket imprimé (reçu par WebSocket ou émis depuis la page) = un patient
+            self.reload_policy.record_patient()
         else:
-            print("Échec de l'impression du ticket.")
+            logger.warning(f"Échec de l'impression du ticket {job_id}.")
+        # Accusé de réception au serveur une fois le ticket réellement imprimé
+        self.socket_manager.acknowledge(job_id, success)
+
+    def on_print_job_abandoned(self, job_id, reason):
+        """ Ticket abandonné (illisible ou trop d'échecs) : le serveur reçoit l'erreur """
+        self.socket_manager.acknowledge(job_id, False, reason)
+
+    def closeEvent(self, event):
+        """ Arrêt propre des threads à la fermeture """
+        self.socket_manager.stop()
+        self.web_view.touch_telemetry.stop()
+        self.print_queue.stop()
+        self.print_spool.close()
+        self.printer_pool.stop()
+        self.request_executor.shutdown()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.stall_detector is not None:
+            self.stall_detector.stop()
+        self.settings_store.stop()
+        super().closeEvent(event)
                 
             
     def on_url_changed(self, url):
-        # Check if 'login' appears in the URL
-        print("URL changed:", url.toString())
-        if "login" in url.toString():
-            self.inject_login_script()            
-
-    def inject_login_script(self):
-        print("Injection de code JS")
-        print(self.username, self.password)
-        # Inject JavaScript to fill and submit the login form automatically
-        script = f"""
-        document.addEventListener('DOMContentLoaded', function() {{
-        console.log("Injecting login script after DOM is fully loaded");
-        var usernameInput = document.querySelector('input[name="username"]');
-        var passwordInput = document.querySelector('input[name="password"]');
-        var rememberCheckbox = document.querySelector('input[name="remember"]');
-        
-        if (usernameInput) {{
-            console.log("Found username input");
-            usernameInput.value = "{self.username}";
-        }} else {{
-            console.log("Username input not found");
-        }}
-
-        if (passwordInput) {{
-            console.log("Found password input");
-            passwordInput.value = "{self.password}";
-        }} else {{
-            console.log("Password input not found");
-        }}
-
-        if (rememberCheckbox) {{
-            console.log("Found remember me checkbox");
-            rememberCheckbox.checked = true;
-        }} else {{
-            console.log("Remember me checkbox not found");
-        }}
-
-        var form = usernameInput ? usernameInput.closest('form') : null;
-        if (form) {{
-            console.log("Found form, submitting");
-            form.submit();
-        }} else {{
-            console.log("Form not found");
-        }}
-    }});
-    """
-        self.web_view.page().runJavaScript(script)
+        # Le remplissage de la page login est fait par le script enregistré (kiosk_scripts)
+        web_logger.info(f"URL changed: {url.toString()}")
+
+    def update_login_script(self):
+        """ Identifiants modifiés : le script de connexion est mis à jour pour les prochains chargements """
+        if hasattr(self, 'scripts'):
+            self.scripts.update_params('login', {'username': self.username, 'password': self.password})
 
 
     def load_preferences(self):
-        """ Chargement des préférences"""
-        settings = QSettings()
-        self.web_url = settings.value("web_url", "http://localhost:5000")
-        self.use_password = settings.value("use_password", False, type=bool)
-        self.unlockpass = settings.value("unlockpass", "")
-        self.username = settings.value("username", "admin")
-        self.password = settings.value("password", "admin")
-        self.idVendor = settings.value("idVendor", "")
-        self.idProduct = settings.value("idProduct", "")
-        self.printer_model = settings.value("printer", "")
-        self.websocket_enabled = settings.value("websocket_enabled", True, type=bool)
+        """ Chargement des préférences (depuis le cache en mémoire) """
+        settings = self.settings_store
+        self.web_url = settings["web_url"]
+        self.use_password = settings["use_password"]
+        self.unlockpass = settings["unlockpass"]
+        self.username = settings["username"]
+        self.password = settings["password"]
+        self.idVendor = settings["idVendor"]
+        self.idProduct = settings["idProduct"]
+        self.printer_model = settings["printer"]
+        # Imprimantes réseau supplémentaires : "hôte[:port], hôte[:port]"
+        self.network_printers = parse_network_printers(settings["network_printers"])
+        self.websocket_enabled = settings["websocket_enabled"]
+        # Formats de ticket acceptés, annoncés au serveur à la connexion
+        self.print_capabilities = {'raw': settings["raw_print_enabled"], 'batch': True, 'templates': True}
+        self.ticket_issue_url = self.web_url + settings["ticket_issue_path"]
+        # Niveau de log modifiable à chaud
+        set_level(None, settings["log_level"])
+        # Textes fixes des tickets (lignes séparées par des retours à la ligne)
+        self.ticket_header = [settings["pharmacy_name"]] + settings["ticket_header"].splitlines()
+        self.ticket_header = [line for line in self.ticket_header if line]
+        self.ticket_footer = settings["ticket_footer"].splitlines()
+        self.ticket_logo = settings["ticket_logo"]
+        self.ticket_encoding = settings["ticket_encoding"]
+        self.ticket_codepage = settings["ticket_codepage"]
+        self.metrics_port = settings["metrics_port"]
+        self.stall_threshold_ms = settings["stall_threshold_ms"]
+        self.reload_mode = settings["reload_mode"]
+        self.reload_thresholds = {
+            'max_rss_mb': settings["reload_max_rss_mb"],
+            'max_js_heap_mb': settings["reload_max_js_heap_mb"],
+            'max_cpu_percent': settings["reload_max_cpu_percent"],
+            'max_input_latency_ms': settings["reload_max_input_latency_ms"],
+            'patient_before_reload': settings["reload_patient_limit"],
+            'idle_seconds': settings["reload_idle_seconds"],
+        }
+        self.cache_policy = settings["cache_policy"]
+        self.cache_size_mb = settings["cache_size_mb"]
+        self.cache_prefetch = settings["cache_prefetch"]
+        self.cache_prefetch_urls = [u for u in settings["cache_prefetch_urls"].split(",") if u.strip()]
+        self.update_login_script()
 
 
     def keyPressEvent(self, event):
@@ -597,11 +784,9 @@ class MainWindow(QMainWindow):
         """ Ouvre la page des préférences """
         if self.preferences_dialog.exec() == QDialog.Accepted:
             new_secret = self.preferences_dialog.get_secret_sequence()
-            if new_secret:
-                self.unlockpass = new_secret
-                settings = QSettings()
-                settings.setValue("unlockpass", self.unlockpass)
-                print(f"New secret sequence set: {self.unlockpass}")
+            if new_secret and new_secret != self.unlockpass:
+                self.settings_store.set("unlockpass", new_secret)
+                logger.info("New secret sequence set")
 
     def enter_fullscreen(self):
         """ Retourner en plein écran"""
@@ -610,7 +795,7 @@ class MainWindow(QMainWindow):
 
     def handle_touch_failure(self):
         # Gérer l'échec du test tactile
-        print("Problème tactile détecté!")
+        touch_logger.warning("Problème tactile détecté!")
         # Ajouter votre logique de gestion ici
 
 
@@ -621,6 +806,12 @@ if __name__ == "__main__":
     app.setOrganizationName("PharmaFile")
     app.setOrganizationDomain("mycompany.com")
 
-    window = MainWindow()
+    # Préférences lues une seule fois, puis gardées en mémoire
+    settings_store = SettingsStore().load()
+
+    # Journalisation centralisée (JSON, rotation, écriture dans un thread dédié)
+    setup_logging(level=settings_store["log_level"])
+
+    window = MainWindow(settings_store)
     window.show()
     app.exec()
\ No newline at end of file
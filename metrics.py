@@ -0,0 +1,227 @@
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PySide6.QtCore import QObject, QTimer
+from logging_setup import get_logger
+
+logger = get_logger('metrics')
+
+START_TIME = time.time()
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    """ Valeur instantanée, fixée par set() ou lue à la demande via une fonction """
+    type = 'gauge'
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+            if value is None:
+                return []
+            return [(self.name, value)]
+        return [(self.name, self.value)]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append((f'{self.name}_bucket{{le="{bound}"}}', cumulative))
+        samples.append((f'{self.name}_bucket{{le="+Inf"}}', count))
+        samples.append((f'{self.name}_sum', total))
+        samples.append((f'{self.name}_count', count))
+        return samples
+
+
+class MetricsRegistry:
+    """ Métriques de la borne, au format texte Prometheus.
+    Chaque module déclare ses métriques à l'import ; un nom déjà déclaré renvoie la même métrique """
+
+    def __init__(self):
+        self.metrics = {}
+        self.health_checks = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                self.metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text, fn=None):
+        gauge = self._get_or_create(Gauge, name, help_text)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help_text, buckets):
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def add_health_check(self, name, fn):
+        """ fn() retourne (ok, détails) ; appelée depuis le thread du serveur HTTP """
+        self.health_checks[name] = fn
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def health(self):
+        checks = {}
+        healthy = True
+        for name, fn in list(self.health_checks.items()):
+            try:
+                ok, details = fn()
+            except Exception as e:
+                ok, details = False, f"erreur : {e}"
+            checks[name] = {'ok': ok, 'details': details}
+            healthy = healthy and ok
+        return {
+            'status': 'ok' if healthy else 'degraded',
+            'uptime': round(time.time() - START_TIME, 1),
+            'checks': checks,
+        }
+
+
+registry = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, 'text/plain; version=0.0.4; charset=utf-8', registry.render())
+        elif self.path == '/health':
+            health = registry.health()
+            # 503 : le watchdog de la flotte peut réagir sans analyser le JSON
+            status = 200 if health['status'] == 'ok' else 503
+            self._send(status, 'application/json', json.dumps(health, ensure_ascii=False))
+        else:
+            self._send(404, 'text/plain', 'not found\n')
+
+    def _send(self, status, content_type, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class MetricsServer:
+    """ Petit serveur HTTP local (thread d'arrière-plan) : /metrics et /health """
+
+    def __init__(self, host='127.0.0.1', port=9108):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        except OSError as e:
+            logger.error(f"Serveur de métriques indisponible sur {self.host}:{self.port} : {e}")
+            return
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+        logger.info(f"Métriques disponibles sur http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class EventLoopLagProbe(QObject):
+    """ Mesure le retard de la boucle Qt : un minuteur régulier compare l'heure réelle
+    de son déclenchement à l'heure prévue """
+
+    def __init__(self, interval_ms=500):
+        super().__init__()
+        self.interval = interval_ms / 1000
+        self.lag = registry.gauge('kiosk_event_loop_lag_seconds',
+                                  "Retard du dernier tour de la boucle Qt")
+        self.lag_histogram = registry.histogram('kiosk_event_loop_lag_histogram_seconds',
+                                                "Retards de la boucle Qt",
+                                                (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+        self._expected = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._expected = time.monotonic() + self.interval
+        self.timer.start(int(self.interval * 1000))
+
+    def _tick(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        self.lag.set(round(lag, 4))
+        self.lag_histogram.observe(lag)
+        self._expected = now + self.interval
@@ -1,121 +1,226 @@
 import re
+import json
+import time
 import base64
-import logging
-from escpos.printer import Usb
+from print_spool import RawTicket, job_from_message
 from escpos.exceptions import USBNotFoundError
-from request_handler import RequestThread
+from ticket_templates import TicketTemplateEngine
 from PySide6.QtCore import QObject, Slot, QObject, QTimer, Qt, QEvent, Signal
+from logging_setup import get_logger
+from metrics import registry
 
-logging.basicConfig(
-    filename='app_reload.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s'
-)
+logger = get_logger('print')
 
-try:
-    p = Usb(0x04b8, 0x0202, profile="TM-T88II")
-except USBNotFoundError:
-    print("Avertissement : Imprimante USB non trouvée. Assurez-vous que l'imprimante est connectée.")
-    p = None  # Définir p à None pour éviter d'autres erreurs
+PRINT_LATENCY = registry.histogram('kiosk_print_latency_seconds', "Durée d'impression d'un ticket",
+                                   (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+PRINTS = registry.counter('kiosk_prints_total', "Tickets imprimés")
+PRINT_FAILURES = registry.counter('kiosk_print_failures_total', "Échecs d'impression")
 
-def print_ticket(data):
-    print("Emitting signal with message:", data)
-    p.text(data)
-    p.cut()
 
 class Bridge(QObject):
-    """ Au départ uniquement pour l'imprimante, mais maintenant gère le reload de la page"""
+    """ Au départ uniquement pour l'imprimante, mais maintenant gère le reload de la page
+    et l'émission directe des tickets (requête HTTP puis impression dès la réponse) """
     reload_requested = Signal()
+    ticket_issued = Signal(str, str)  # identifiant de la demande (JS), résultat JSON
+    REQUEST_PREFIX = "issue-ticket:"
 
-    def __init__(self, printer):
+    def __init__(self, print_queue, request_executor=None, issue_url=None, app_token=None,
+                 raw_enabled=False, timeout=10):
         super().__init__()
-        self.printer = printer
-        self.patients_counter = 0
-        self.patient_before_reload = 3
+        self.print_queue = print_queue
+        self.request_executor = request_executor
+        self.issue_url = issue_url
+        self.app_token = app_token
+        self.raw_enabled = raw_enabled
+        self.timeout = timeout
+        if request_executor is not None:
+            request_executor.finished.connect(self._on_issue_response)
 
     @Slot(str)
     def print_ticket(self, message):
-        print(f"Received message to print: {message}")
+        logger.debug(f"Received message to print: {message}")
 
-        if self.printer:
-            self.printer.print(message)
+        if self.print_queue:
+            # Mise en file : l'impression se fait dans le thread dédié
+            self.print_queue.submit(message)
         else:
-            print("Printer not available")
+            logger.warning("Printer not available")
+
+    @Slot(str, str)
+    def issue_ticket(self, request_id, payload):
+        """ Demande de ticket depuis la page (/patient) : POST au serveur par la session HTTP
+        partagée, puis impression directe de la réponse, sans attendre le WebSocket.
+        Le résultat est renvoyé à JavaScript par le signal ticket_issued (voir kioskIssueTicket) """
+        if self.request_executor is None or not self.issue_url:
+            self._issue_result(request_id, ok=False, error="Émission directe des tickets non configurée")
+            return
+        headers = {'Content-Type': 'application/json'}
+        if self.app_token:
+            headers['X-App-Token'] = self.app_token
+        # Pas de nouvelle tentative : un POST rejoué pourrait créer deux tickets
+        self.request_executor.post(self.issue_url, data=payload.encode('utf-8'), headers=headers,
+                                   timeout=self.timeout, retries=0,
+                                   request_id=self.REQUEST_PREFIX + request_id)
+
+    def _on_issue_response(self, request_id, error, text, status_code):
+        if not request_id.startswith(self.REQUEST_PREFIX):
+            return  # réponse d'une autre requête de l'exécuteur partagé
+        request_id = request_id[len(self.REQUEST_PREFIX):]
+        if error or status_code not in (200, 201):
+            logger.warning(f"Émission du ticket refusée : {error or status_code}")
+            self._issue_result(request_id, ok=False, error=error or f"HTTP {status_code}", status=status_code)
+            return
+        try:
+            response = json.loads(text)
+            data, job_id = job_from_message(response, self.raw_enabled)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.error(f"Réponse d'émission de ticket illisible : {e}")
+            self._issue_result(request_id, ok=False, error=f"Réponse illisible : {e}", status=status_code)
+            return
+        if not job_id:
+            # Sans identifiant serveur, impossible de reconnaître le même ticket reçu par WebSocket
+            logger.error("Réponse d'émission de ticket sans identifiant, ticket non imprimé")
+            self._issue_result(request_id, ok=False, error="Réponse sans identifiant de ticket",
+                               status=status_code)
+            return
+        # Même identifiant que l'éventuel message WebSocket : le ticket n'est imprimé qu'une fois
+        job_id = self.print_queue.submit(data, job_id)
+        response.pop('data', None)  # inutile côté page (et éventuellement binaire)
+        self._issue_result(request_id, ok=True, job_id=job_id, status=status_code, response=response)
+
+    def _issue_result(self, request_id, **result):
+        self.ticket_issued.emit(request_id, json.dumps(result, ensure_ascii=False, default=str))
 
     @Slot()
     def request_reload(self):
         """Demande un rechargement depuis JavaScript. Permet de limiter le risque de perte du tactile.
         Un redémarrage tous les 15 patients pour l'instant"""
-        print("Rechargement demandé depuis JavaScript")
+        logger.info("Rechargement demandé depuis JavaScript")
         if self.web_view:
-            print("Exécution du rechargement")
-            self.web_view.reload()
+            logger.info("Exécution du rechargement")
+            self.web_view.reload_page()
         else:
-            print("web_view n'est pas défini dans Bridge")
+            logger.warning("web_view n'est pas défini dans Bridge")
 
 class Printer:
-    def __init__(self, idVendor, idProduct, printer_model, web_url, session, app_token):
-        self.idVendor = int(idVendor, 16)
-        self.idProduct = int(idProduct, 16)
-        self.printer_model = printer_model
-        self.session = session
-        self.web_url = web_url
-        self.app_token = app_token
+    """ Une imprimante du pool (USB ou réseau). Son état est remonté au pool,
+    qui le regroupe avec celui des autres imprimantes avant l'envoi au serveur """
+
+    def __init__(self, device_manager, pool, templates=None):
+        self.device_manager = device_manager
+        self.pool = pool
+        self.name = device_manager.name
+        # Parties fixes des tickets encodées une seule fois
+        self.templates = templates or TicketTemplateEngine()
         self.p = None
         self.error = None
         self.encoding = 'utf-8'
-        self.initialize_printer()
-    
+        # L'imprimante n'est pas ouverte ici : elle l'est au premier ticket ou à sa détection
+        self.device_manager.device_attached.connect(self.on_device_attached)
+        self.device_manager.device_detached.connect(self.on_device_detached)
+
+    def available(self):
+        """ Imprimante utilisable (état inconnu au démarrage : on tente l'impression) """
+        return not self.error
+
+    def on_device_attached(self):
+        # La poignée périmée est rouverte par le thread d'impression (voir write)
+        logger.info(f"Imprimante {self.name} détectée")
+
+    def on_device_detached(self):
+        logger.warning(f"Avertissement : Imprimante {self.name} débranchée.")
+        self.error = True
+        self.send_printer_status(True, "Imprimante non trouvée.")
+
     def initialize_printer(self):
         try:
-            self.p = Usb(self.idVendor, self.idProduct, profile=self.printer_model)
-            self.send_printer_status(False, "Imprimante USB initialisée avec succès.")
+            self.p = self.device_manager.get_device()
             self.error = False
-            print("Imprimante initialisée avec succès.")
+            self.send_printer_status(False, "Imprimante initialisée avec succès.")
+            logger.info(f"Imprimante {self.name} initialisée avec succès.")
         except USBNotFoundError:
-            print("Avertissement : Imprimante USB non trouvée. Assurez-vous que l'imprimante est connectée.")
+            logger.warning("Avertissement : Imprimante USB non trouvée. Assurez-vous que l'imprimante est connectée.")
             self.p = None
             self.error = True
             self.send_printer_status(True, "Imprimante USB non trouvée.")
         except Exception as e:
-            print(f"Erreur lors de l'initialisation : {e}")
+            logger.error(f"Erreur lors de l'initialisation de {self.name} : {e}")
             self.p = None
             self.error = True
             self.send_printer_status(True, f"Erreur lors de l'initialisation : {e}")
 
     def print(self, data):
+        return self.print_batch([data])[0]
+
+    def print_batch(self, datas):
+        """ Imprime plusieurs tickets en une seule écriture. Retourne le résultat de chaque ticket :
+        True (imprimé), False (échec de l'imprimante, à réessayer) ou None (ticket illisible,
+        inutile de réessayer) """
+        start = time.perf_counter()
+        results = [None] * len(datas)
+        tickets = []
+        for index, data in enumerate(datas):
+            try:
+                tickets.append(self.render(data))
+                results[index] = True
+            except Exception as e:
+                # Ticket illisible : l'imprimante n'y est pour rien, elle reste disponible
+                PRINT_FAILURES.inc()
+                logger.error(f"Ticket illisible : {e}")
+        if not tickets:
+            return results
+        # Un ticket seul est envoyé sans copie (flux brut ou ticket déjà rendu)
+        buffer = tickets[0] if len(tickets) == 1 else b''.join(tickets)
+        if not self.write(buffer):
+            PRINT_FAILURES.inc(len(tickets))
+            return [False if result else None for result in results]
+        PRINT_LATENCY.observe(time.perf_counter() - start)
+        PRINTS.inc(len(tickets))
+        return results
+
+    def write(self, buffer):
+        """ Envoi des octets ESC/POS à l'imprimante, en une seule écriture """
+        if self.p is None or self.device_manager.stale:
+            self.initialize_printer()
         if self.p is None:
-            print("Erreur : L'imprimante n'est pas initialisée correctement.")
+            logger.error("Erreur : L'imprimante n'est pas initialisée correctement.")
             self.error = True
             self.send_printer_status(True, "Imprimante non initialisée correctement.")
             return False
 
         try:
-            data = base64.b64decode(data).decode(self.encoding)
-            print("Émission du signal avec le message :", data)
-            self.p.text(data)
-            self.p.cut()
+            # Ticket complet en une seule écriture (au lieu de text() puis cut())
+            self.device_manager.write(self.p, buffer)
             if self.error:
                 self.error = False
                 self.send_printer_status(False, "Impression réussie.")
             return True
         except Exception as e:
-            print(f"Erreur lors de l'impression : {e}")
+            logger.error(f"Erreur lors de l'impression sur {self.name} : {e}")
+            # La poignée est peut-être invalide : elle sera rouverte au prochain ticket
+            self.device_manager.invalidate()
+            self.p = None
+            self.error = True
             self.send_printer_status(True, f"Erreur lors de l'impression : {e}")
             return False
-        
-    def send_printer_status(self, error, error_message):
-        url = f'{self.web_url}/api/printer/status'
-        data = {'error': error, 'message': error_message}
-        headers = {
-            'X-App-Token': self.app_token,
-            'Content-Type': 'application/json'  # Ajoutez l'en-tête Content-Type pour le JSON
-        }
-        
-        # Envoyer les données au format JSON
-        self.printer_thread = RequestThread(url, self.session, method='POST', json=data, headers=headers)
-        #self.printer_thread.result.connect(self.handle_user_result)
-        self.printer_thread.start()
-        
 
+    def render(self, data):
+        """ Octets ESC/POS du ticket : flux brut (RawTicket, envoyé tel quel), modèle + champs (dict),
+        texte UTF-8 reçu en binaire (bytes) ou texte libre encodé en base64 (str, ancien format) """
+        if isinstance(data, RawTicket):
+            return data
+        if isinstance(data, dict):
+            template = self.templates.get(data.get('template'))
+            return template.render(data.get('fields') or {})
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        text = bytes(data).decode(self.encoding)
+        logger.debug("Ticket texte : %s", text)
+        return self.templates.default.render_text(text)
+
+    def send_printer_status(self, error, error_message):
+        """ Transmis au pool, qui envoie l'état global sans bloquer l'appelant """
+        self.pool.on_printer_status(self, error, error_message)
 
+    def stop(self, timeout_ms=5000):
+        self.device_manager.stop(timeout_ms)
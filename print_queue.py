@@ -0,0 +1,265 @@
+import time
+import queue
+import threading
+from collections import deque
+from PySide6.QtCore import QObject, QThread, Signal
+from print_spool import new_job_id
+from logging_setup import get_logger
+
+logger = get_logger('print')
+
+
+class PrintWorker(QThread):
+    """ Thread d'impression longue durée, un par imprimante : consomme la file partagée
+    et appelle son imprimante. Les écritures (parfois lentes) ne bloquent ainsi jamais
+    la boucle Qt, et une imprimante lente ou bloquée ne retient pas les autres """
+    job_finished = Signal(str, bool)  # job_id, succès
+    job_abandoned = Signal(str, str)  # job_id, raison
+
+    def __init__(self, print_queue, printer, retry_interval=10, max_attempts=5):
+        super().__init__()
+        self.print_queue = print_queue
+        self.jobs = print_queue.jobs
+        self.failed = print_queue.failed  # tickets en échec, partagés par toutes les imprimantes
+        self.printer = printer
+        self.spool = print_queue.spool
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._should_run = True
+        self.current_ids = set()  # tickets en cours d'impression
+
+    def run(self):
+        while self._should_run:
+            if not self.printer.available():
+                # Imprimante en erreur : elle ne prend plus de tickets, les autres s'en chargent.
+                # Nouvel essai régulier, ou immédiat si elle est rebranchée
+                self._wake.wait(self.retry_interval)
+                self._wake.clear()
+                if self._should_run:
+                    self.recover()
+                continue
+            self.drain_overflow()
+            try:
+                job = self.jobs.get(timeout=self.retry_interval)
+            except queue.Empty:
+                self.replay_failed()
+                continue
+            try:
+                if job is None:  # sentinelle d'arrêt
+                    break
+                if job.get('replay'):
+                    self.replay_failed()
+                    continue
+                if not self._claim(job):
+                    break
+                try:
+                    self.process(job)
+                finally:
+                    self.current_ids = set()
+            finally:
+                self.jobs.task_done()
+
+    def _claim(self, job):
+        """ Réserve le ticket, sauf si l'arrêt vient d'être demandé : il reste alors dans le journal
+        et sera repris par la file suivante (voir PrintQueue.stop) """
+        with self.print_queue.lock:
+            if not self._should_run:
+                return False
+            self.current_ids = {j['id'] for j in job.get('batch') or [job]}
+            return True
+
+    def process(self, job):
+        # Un lot de tickets part en une seule écriture vers l'imprimante
+        jobs = job.get('batch') or [job]
+        try:
+            results = self.printer.print_batch([j['data'] for j in jobs])
+        except Exception as e:
+            logger.exception(f"Erreur inattendue dans le thread d'impression : {e}")
+            results = [False] * len(jobs)
+        done = [j['id'] for j, result in zip(jobs, results) if result]
+        if done:
+            self.spool.mark_done(*done)
+        unreadable = [j['id'] for j, result in zip(jobs, results) if result is None]
+        if unreadable:
+            self.abandon(unreadable, "ticket illisible")
+        failed = [j for j, result in zip(jobs, results) if result is False]
+        if failed:
+            attempts = self.spool.record_failures(*(j['id'] for j in failed))
+            exhausted = [j['id'] for j, count in zip(failed, attempts) if count >= self.max_attempts]
+            if exhausted:
+                self.abandon(exhausted, f"{self.max_attempts} échecs d'impression")
+            failed = [j for j, count in zip(failed, attempts) if count < self.max_attempts]
+        if failed:
+            # Les tickets restent dans le journal, ils seront rejoués un par un
+            self.failed.extend(failed)
+            if not self.printer.available() and self.print_queue.pool.available_printers():
+                # Bascule immédiate vers une autre imprimante disponible
+                logger.info(f"{len(failed)} ticket(s) redirigé(s) vers une autre imprimante")
+                self.replay_failed()
+        for j, result in zip(jobs, results):
+            self.job_finished.emit(j['id'], bool(result))
+
+    def abandon(self, job_ids, reason):
+        """ Tickets abandonnés : marqués faits dans le journal avec l'erreur, jamais rejoués """
+        logger.error(f"Ticket(s) {', '.join(job_ids)} abandonné(s) : {reason}")
+        self.spool.mark_done(*job_ids, error=reason)
+        for job_id in job_ids:
+            self.job_abandoned.emit(job_id, reason)
+
+    def recover(self):
+        """ Vérifie si l'imprimante en erreur répond de nouveau """
+        self.printer.initialize_printer()
+        if self.printer.available():
+            logger.info(f"Imprimante {self.printer.name} de nouveau disponible")
+            self.replay_failed()
+
+    def replay_failed(self):
+        """ Remet en file les tickets en échec : ils seront pris par une imprimante disponible """
+        if not self.failed:
+            return
+        logger.info(f"Réimpression de {len(self.failed)} ticket(s) en attente")
+        self._move_to_queue(self.failed)
+
+    def drain_overflow(self):
+        """ Remet en file les tickets arrivés quand la file était pleine, dès qu'il y a de la place """
+        self._move_to_queue(self.print_queue.overflow)
+
+    def _move_to_queue(self, jobs):
+        while jobs:
+            try:
+                job = jobs.popleft()
+            except IndexError:
+                break  # vidée par un autre thread d'impression
+            try:
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                jobs.appendleft(job)
+                break
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._should_run = False
+        self._wake.set()
+
+
+class PrintQueue(QObject):
+    """ File FIFO bornée des tickets à imprimer, partagée par les imprimantes du pool.
+    submit() ne bloque jamais : si la file est pleine, le ticket est refusé et signalé.
+    Chaque ticket est journalisé dans le spool jusqu'à confirmation de l'imprimante """
+    job_queued = Signal(str)
+    job_finished = Signal(str, bool)  # job_id, succès
+    job_abandoned = Signal(str, str)  # job_id, raison (ticket illisible, trop d'échecs)
+
+    def __init__(self, pool, spool, maxsize=50, retry_interval=10, max_attempts=5):
+        super().__init__()
+        self.pool = pool
+        self.spool = spool
+        self.lock = threading.Lock()  # arrêt des threads / réservation d'un ticket
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.failed = deque()
+        self.overflow = deque()  # tickets arrivés file pleine, repris par les threads d'impression
+        # Un thread par imprimante : la première libre prend le ticket suivant
+        self.workers = [PrintWorker(self, printer, retry_interval, max_attempts) for printer in pool.printers]
+        for worker in self.workers:
+            worker.job_finished.connect(self.job_finished)
+            worker.job_abandoned.connect(self.job_abandoned)
+            worker.printer.device_manager.device_attached.connect(worker.wake)
+
+    def start(self, held=()):
+        """ Rejoue les tickets restés en attente (dernière exécution ou file précédente),
+        sauf ceux qu'une file précédente est encore en train d'imprimer (voir adopt) """
+        held = set(held)
+        for job in self.spool.pending_jobs():
+            if job['id'] not in held:
+                self._enqueue(job)
+        for worker in self.workers:
+            worker.start()
+
+    def adopt(self, job_ids):
+        """ Reprend les tickets d'une file précédente une fois ses threads arrêtés :
+        seuls ceux qui n'ont pas été imprimés sont remis en file """
+        job_ids = set(job_ids)
+        for job in self.spool.pending_jobs():
+            if job['id'] in job_ids:
+                self._enqueue(job)
+
+    def submit(self, data, job_id=None):
+        """ Ajoute un ticket à la file. Retourne l'identifiant du travail.
+        Seuls les identifiants fournis par le serveur servent à ignorer les doublons ;
+        un ticket sans identifiant en reçoit un nouveau et est toujours imprimé """
+        job_id = job_id or new_job_id()
+        if not self.spool.add(job_id, data):
+            logger.info(f"Ticket {job_id} déjà reçu, ignoré")
+            if self.spool.is_done(job_id):
+                # Déjà imprimé : on le signale pour que l'accusé de réception parte quand même
+                self.job_finished.emit(job_id, True)
+            return job_id
+        self._enqueue({'id': job_id, 'data': data})
+        return job_id
+
+    def submit_batch(self, items):
+        """ Ajoute un lot de tickets [(données, job_id)] : une écriture dans le spool
+        et une seule entrée dans la file, imprimée en une fois. Retourne les identifiants """
+        jobs = [(job_id or new_job_id(), data) for data, job_id in items]
+        new = self.spool.add_many(jobs)
+        new_ids = {job_id for job_id, _ in new}
+        for job_id, _ in jobs:
+            if job_id not in new_ids:
+                logger.info(f"Ticket {job_id} déjà reçu, ignoré")
+                if self.spool.is_done(job_id):
+                    self.job_finished.emit(job_id, True)
+        if len(new) == 1:
+            self._enqueue({'id': new[0][0], 'data': new[0][1]})
+        elif new:
+            self._enqueue({'batch': [{'id': job_id, 'data': data} for job_id, data in new]})
+        return [job_id for job_id, _ in jobs]
+
+    def _enqueue(self, job):
+        job_ids = [j['id'] for j in job.get('batch') or [job]]
+        try:
+            if self.overflow:
+                raise queue.Full  # des tickets plus anciens attendent déjà : l'ordre est conservé
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            # Affluence : le ticket attend dans la réserve, il passe dès qu'une place se libère
+            logger.warning(f"File d'impression pleine, ticket(s) {', '.join(job_ids)} mis en attente")
+            self.overflow.append(job)
+        for job_id in job_ids:
+            self.job_queued.emit(job_id)
+
+    def request_replay(self):
+        """ Demande aux threads d'impression de rejouer les tickets en échec (imprimante rebranchée) """
+        for worker in self.workers:
+            worker.wake()
+        try:
+            self.jobs.put_nowait({'replay': True})
+        except queue.Full:
+            pass  # les threads rejoueront d'eux-mêmes dès que la file sera vide
+
+    def stop(self, timeout_ms=5000):
+        """ Arrête les threads d'impression : un thread au milieu d'une écriture termine son ticket,
+        les autres tickets restent dans le journal. L'attente est bornée (timeout_ms au total,
+        0 = aucune attente) ; retourne True si tous les threads sont arrêtés """
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+        for worker in self.workers:
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout_ms / 1000
+        for worker in self.workers:
+            worker.wait(max(0, int((deadline - time.monotonic()) * 1000)))
+        return self.stopped()
+
+    def stopped(self):
+        return not any(worker.isRunning() for worker in self.workers)
+
+    def in_flight(self):
+        """ Tickets en cours d'impression (après stop(), aucun autre ne sera pris) """
+        with self.lock:
+            return set().union(*(worker.current_ids for worker in self.workers))
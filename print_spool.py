@@ -0,0 +1,258 @@
+import os
+import json
+import base64
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from logging_setup import get_logger
+
+logger = get_logger('print')
+
+
+def new_job_id():
+    """ Identifiant unique d'un ticket reçu sans identifiant serveur : deux tickets identiques
+    (même numéro réimprimé, texte fixe) sont bien imprimés deux fois """
+    return uuid.uuid4().hex
+
+
+class RawTicket(bytes):
+    """ Flux ESC/POS prêt à imprimer, envoyé tel quel à l'imprimante (mode brut) """
+
+
+def job_from_message(message, raw_enabled=False):
+    """ (ticket, identifiant) d'un message de ticket (WebSocket ou réponse HTTP).
+    L'identifiant est None si le serveur n'en fournit pas (voir new_job_id). Le ticket est transmis tel quel à l'imprimante : flux ESC/POS brut, modèle + champs,
+    texte binaire (pièce jointe) ou texte base64 (ancien format) """
+    if message.get('mode') == 'raw':
+        if not raw_enabled:
+            raise ValueError("mode brut désactivé sur cette borne")
+        raw = message['data']
+        # Pièce jointe binaire Socket.IO de préférence ; base64 accepté
+        payload = RawTicket(base64.b64decode(raw) if isinstance(raw, str) else raw)
+    elif 'fields' in message:
+        # Ticket par modèle : seuls les champs variables sont transmis
+        payload = {'template': message.get('template'), 'fields': message['fields']}
+    else:
+        payload = message['data']
+        if isinstance(payload, bytearray):
+            payload = bytes(payload)
+    job_id = message.get('job_id') or message.get('id')
+    return payload, (str(job_id) if job_id else None)
+
+
+def add_record(job_id, data):
+    """ Enregistrement 'add' du journal ; les tickets binaires sont stockés en base64 """
+    if isinstance(data, RawTicket):
+        return {'op': 'add', 'id': job_id, 'raw': base64.b64encode(data).decode('ascii')}
+    if isinstance(data, bytes):
+        return {'op': 'add', 'id': job_id, 'bytes': base64.b64encode(data).decode('ascii')}
+    return {'op': 'add', 'id': job_id, 'data': data}
+
+
+def record_data(record):
+    if 'raw' in record:
+        return RawTicket(base64.b64decode(record['raw']))
+    if 'bytes' in record:
+        return base64.b64decode(record['bytes'])
+    return record['data']
+
+
+class JobIdIndex:
+    """ Ensemble borné d'identifiants (ordre d'insertion, les plus anciens sont oubliés).
+    Sert à ignorer en O(1) un ticket déjà imprimé et renvoyé après une reconnexion """
+
+    def __init__(self, maxsize=500):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+
+    def add(self, job_id):
+        self._ids[job_id] = None
+        self._ids.move_to_end(job_id)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def __contains__(self, job_id):
+        return job_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+_STOP = object()  # sentinelle d'arrêt du thread d'écriture du journal
+
+
+class PrintSpool:
+    """ Journal d'impression sur disque (JSONL, ajout seul).
+    Chaque ticket est écrit ('add') dès sa réception et marqué ('done') une fois imprimé :
+    après un plantage ou un redémarrage, les tickets non confirmés sont réimprimés.
+    Les échecs d'impression sont comptés ('attempt') : un ticket illisible ou qui échoue trop
+    souvent est abandonné (marqué 'done' avec une erreur) au lieu d'être rejoué indéfiniment.
+    L'état en mémoire est mis à jour immédiatement ; l'écriture et la synchronisation disque
+    (fsync) sont faites par un thread dédié, qui regroupe les enregistrements en attente :
+    add() ne bloque jamais le thread de l'interface """
+
+    def __init__(self, path='print_spool.jsonl', max_done_ids=500, compact_every=200):
+        self.path = path
+        self.compact_every = compact_every
+        self.pending = OrderedDict()  # job_id -> data
+        self.attempts = {}  # job_id -> nombre d'échecs d'impression
+        self.done_ids = JobIdIndex(max_done_ids)
+        self._lock = threading.Lock()
+        self._records_since_compact = 0
+        self._load()
+        self._compact()
+        self._records = queue.Queue()  # enregistrements à écrire, dans l'ordre
+        self._writer = threading.Thread(target=self._write_loop, name="print-spool", daemon=True)
+        self._writer.start()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par un arrêt brutal : on l'ignore
+                    logger.warning(f"Ligne du journal d'impression illisible ignorée : {line[:50]!r}")
+                    continue
+                if record.get('op') == 'add':
+                    if record['id'] not in self.done_ids:
+                        self.pending[record['id']] = record_data(record)
+                elif record.get('op') == 'attempt':
+                    if record['id'] in self.pending:
+                        self.attempts[record['id']] = record['count']
+                elif record.get('op') == 'done':
+                    self.pending.pop(record['id'], None)
+                    self.attempts.pop(record['id'], None)
+                    self.done_ids.add(record['id'])
+        if self.pending:
+            logger.info(f"{len(self.pending)} ticket(s) en attente dans le journal d'impression")
+
+    def _append(self, *records):
+        """ Confie des enregistrements au thread d'écriture (appelé sous self._lock) """
+        for record in records:
+            self._records.put(record)
+
+    def _take_records(self, items):
+        """ Complète items avec ce qui attend dans la file, sans bloquer, puis les trie :
+        (enregistrements, demandes de synchronisation, arrêt demandé) """
+        while True:
+            try:
+                items.append(self._records.get_nowait())
+            except queue.Empty:
+                break
+        records = [item for item in items if isinstance(item, dict)]
+        flushes = [item for item in items if isinstance(item, threading.Event)]
+        return records, flushes, _STOP in items
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            records, flushes, stop = self._take_records([self._records.get()])
+            try:
+                if records:
+                    # Un seul fsync pour tous les enregistrements arrivés entre-temps
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(''.join(json.dumps(record) + '\n' for record in records))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._records_since_compact += len(records)
+                if self._records_since_compact >= self.compact_every:
+                    with self._lock:
+                        # L'état en mémoire contient déjà les enregistrements pas encore écrits
+                        _, more_flushes, more_stop = self._take_records([])
+                        self._compact()
+                    flushes += more_flushes
+                    stop = stop or more_stop
+            except OSError as e:
+                logger.error(f"Écriture du journal d'impression impossible : {e}")
+            for flushed in flushes:
+                flushed.set()
+
+    def flush(self, timeout=5):
+        """ Attend que les enregistrements déjà confiés soient sur disque """
+        flushed = threading.Event()
+        self._records.put(flushed)
+        return flushed.wait(timeout)
+
+    def close(self, timeout=5):
+        """ Écrit les derniers enregistrements puis arrête le thread d'écriture """
+        self._records.put(_STOP)
+        self._writer.join(timeout)
+
+    def _compact(self):
+        """ Réécrit le journal avec uniquement les tickets en attente et l'index des tickets faits """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for job_id in self.done_ids:
+                f.write(json.dumps({'op': 'done', 'id': job_id}) + '\n')
+            for job_id, data in self.pending.items():
+                f.write(json.dumps(add_record(job_id, data)) + '\n')
+                if job_id in self.attempts:
+                    f.write(json.dumps({'op': 'attempt', 'id': job_id, 'count': self.attempts[job_id]}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._records_since_compact = 0
+
+    def add(self, job_id, data):
+        """ Enregistre un ticket. Retourne False si c'est un doublon (déjà imprimé ou en cours) """
+        with self._lock:
+            if job_id in self.done_ids or job_id in self.pending:
+                return False
+            self._append(add_record(job_id, data))
+            self.pending[job_id] = data
+            return True
+
+    def add_many(self, jobs):
+        """ Enregistre un lot de tickets [(job_id, data)] en une seule écriture.
+        Retourne les tickets nouveaux (sans les doublons) """
+        with self._lock:
+            new, seen = [], set()
+            for job_id, data in jobs:
+                if job_id in self.done_ids or job_id in self.pending or job_id in seen:
+                    continue
+                seen.add(job_id)
+                new.append((job_id, data))
+            if new:
+                self._append(*(add_record(job_id, data) for job_id, data in new))
+                for job_id, data in new:
+                    self.pending[job_id] = data
+            return new
+
+    def is_done(self, job_id):
+        with self._lock:
+            return job_id in self.done_ids
+
+    def mark_done(self, *job_ids, error=None):
+        """ Confirme l'impression d'un ou plusieurs tickets, ou leur abandon si error est donnée """
+        with self._lock:
+            if error is None:
+                self._append(*({'op': 'done', 'id': job_id} for job_id in job_ids))
+            else:
+                self._append(*({'op': 'done', 'id': job_id, 'error': error} for job_id in job_ids))
+            for job_id in job_ids:
+                self.pending.pop(job_id, None)
+                self.attempts.pop(job_id, None)
+                self.done_ids.add(job_id)
+
+    def record_failures(self, *job_ids):
+        """ Compte un échec d'impression pour chaque ticket. Retourne le nombre d'échecs de chacun """
+        with self._lock:
+            counts = []
+            for job_id in job_ids:
+                self.attempts[job_id] = self.attempts.get(job_id, 0) + 1
+                counts.append(self.attempts[job_id])
+            self._append(*({'op': 'attempt', 'id': job_id, 'count': count}
+                           for job_id, count in zip(job_ids, counts)))
+            return counts
+
+    def pending_jobs(self):
+        """ Tickets reçus mais pas encore confirmés, dans l'ordre de réception """
+        with self._lock:
+            return [{'id': job_id, 'data': data} for job_id, data in self.pending.items()]
@@ -0,0 +1,371 @@
+import time
+import random
+import socket
+import struct
+import threading
+from PySide6.QtCore import QObject, QThread, Signal
+from logging_setup import get_logger
+
+logger = get_logger('printer')
+
+
+def parse_usb_id(value):
+    """ Convertit un identifiant USB saisi dans les préférences ('0x04b8' ou '04b8') """
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+class UsbBackend:
+    """ Accès réel aux imprimantes USB via escpos / pyusb (importés à la demande) """
+
+    def open(self, idVendor, idProduct, printer_model):
+        from escpos.printer import Usb
+        if printer_model:
+            return Usb(idVendor, idProduct, profile=printer_model)
+        return Usb(idVendor, idProduct)
+
+    def present(self, idVendor, idProduct):
+        import usb.core
+        return usb.core.find(idVendor=idVendor, idProduct=idProduct) is not None
+
+    @staticmethod
+    def packet_size(device, default=64):
+        """ wMaxPacketSize du point de sortie de l'imprimante (lu une fois par poignée) """
+        size = getattr(device, '_kiosk_packet_size', None)
+        if size is None:
+            size = default
+            try:
+                for interface in device.device.get_active_configuration():
+                    for endpoint in interface:
+                        if endpoint.bEndpointAddress == device.out_ep:
+                            size = endpoint.wMaxPacketSize
+            except Exception as e:
+                logger.debug(f"Taille de paquet USB inconnue, {default} octets utilisés : {e}")
+            device._kiosk_packet_size = size
+        return size
+
+    def write(self, device, data, packets_per_write=64):
+        """ Écriture directe sur le point de sortie USB, par blocs alignés sur la taille
+        de paquet, à partir d'une memoryview (pas de copie intermédiaire du flux) """
+        view = memoryview(data)
+        if getattr(device, 'device', None) is None:
+            device._raw(view)
+            return
+        chunk = self.packet_size(device) * packets_per_write
+        for offset in range(0, len(view), chunk):
+            device.device.write(device.out_ep, view[offset:offset + chunk], device.timeout)
+
+
+class NetworkBackend:
+    """ Imprimantes réseau (port RAW, 9100 par défaut) via escpos.printer.Network """
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def open(self, host, port, printer_model):
+        from escpos.printer import Network
+        if printer_model:
+            return Network(host, port=port, timeout=self.timeout, profile=printer_model)
+        return Network(host, port=port, timeout=self.timeout)
+
+    def present(self, host, port):
+        try:
+            with socket.create_connection((host, port), timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+
+def parse_network_printers(value):
+    """ Liste 'hôte[:port]' séparée par des virgules -> [(hôte, port)] """
+    printers = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        try:
+            printers.append((host, int(port) if port else 9100))
+        except ValueError:
+            logger.warning(f"Imprimante réseau ignorée (port invalide) : {item}")
+    return printers
+
+
+class FakeDevice:
+    """ Imprimante factice : enregistre les octets reçus au lieu de les envoyer.
+    latency (secondes par écriture) et failure_rate (probabilité d'échec d'une écriture)
+    simulent une imprimante lente ou capricieuse """
+
+    def __init__(self, encoding='utf-8', latency=0, failure_rate=0, rng=None):
+        self.encoding = encoding
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random()
+        self.output = bytearray()
+        self.writes = 0
+        self.cuts = 0
+        self.closed = False
+
+    def _raw(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            raise OSError("Panne simulée de l'imprimante factice")
+        self.output += data
+        self.writes += 1
+
+    def text(self, data):
+        self._raw(data.encode(self.encoding))
+
+    def cut(self):
+        self.cuts += 1
+        self._raw(b'\x1dV\x00')
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBackend:
+    """ Backend sans matériel pour les tests et mesures : l'imprimante est branchée/débranchée
+    à la main, les appareils ouverts partagent la latence et le taux d'échec configurés """
+
+    def __init__(self, connected=True, latency=0, failure_rate=0, seed=None):
+        self.connected = connected
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.devices = []
+
+    def open(self, *address):
+        if not self.connected:
+            from escpos.exceptions import USBNotFoundError
+            raise USBNotFoundError("Imprimante factice débranchée")
+        device = FakeDevice(latency=self.latency, failure_rate=self.failure_rate, rng=self.rng)
+        self.devices.append(device)
+        return device
+
+    def present(self, *address):
+        return self.connected
+
+    @property
+    def bytes_written(self):
+        return sum(len(device.output) for device in self.devices)
+
+
+class FakeNetworkPrinter:
+    """ Imprimante réseau factice : écoute en TCP (port RAW) sur la machine locale et enregistre
+    les octets reçus. Permet de tester le chemin réseau réel (escpos Network, sonde de présence,
+    bascule vers une autre imprimante) sans matériel """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.1)
+        self.host, self.port = self.server.getsockname()[:2]
+        self.received = bytearray()
+        self.connections = []
+        self._lock = threading.Lock()
+        self._running = False
+        self.thread = None
+
+    def start(self):
+        self._running = True
+        self.thread = threading.Thread(target=self._accept_loop, name="fake-network-printer", daemon=True)
+        self.thread.start()
+        return self
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                connection, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with self._lock:
+                self.connections.append(connection)
+            threading.Thread(target=self._read, args=(connection,), daemon=True).start()
+
+    def _read(self, connection):
+        while True:
+            try:
+                data = connection.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            with self._lock:
+                self.received += data
+
+    def stop(self):
+        """ Imprimante éteinte : port fermé et connexions coupées net (RST), comme une panne """
+        self._running = False
+        if self.thread is not None:
+            self.thread.join(1)
+        self.server.close()
+        with self._lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            connection.close()
+
+
+class HotplugWatcher(QThread):
+    """ Surveille la présence de l'imprimante par interrogation périodique du bus USB """
+    presence_changed = Signal(bool)
+
+    def __init__(self, manager, poll_interval=3):
+        super().__init__()
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        present = None
+        while not self._stop_event.is_set():
+            try:
+                now_present = self.manager.present()
+            except Exception as e:
+                logger.error(f"Erreur lors de la détection de l'imprimante : {e}")
+                now_present = False
+            if now_present != present:
+                present = now_present
+                self.presence_changed.emit(present)
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self, timeout_ms=5000):
+        """ Attente bornée : une sonde réseau en cours peut durer jusqu'à son délai maximal """
+        self._stop_event.set()
+        return self.wait(timeout_ms)
+
+
+class PrinterDeviceManager(QObject):
+    """ Gestion de l'imprimante physique : ouverture à la demande, poignée mise en cache
+    et reconnexion automatique quand l'imprimante est rebranchée.
+    La poignée n'est fermée que par le thread qui imprime : un débranchement signalé au thread
+    de l'interface la marque seulement comme périmée (voir mark_stale) """
+    device_attached = Signal()
+    device_detached = Signal()
+
+    def __init__(self, idVendor, idProduct, printer_model, backend=None, poll_interval=3):
+        super().__init__()
+        self.idVendor = parse_usb_id(idVendor)
+        self.idProduct = parse_usb_id(idProduct)
+        self.printer_model = printer_model
+        self.backend = backend or UsbBackend()
+        self._device = None
+        self._stale = False  # poignée à fermer puis rouvrir par le thread d'impression
+        self._lock = threading.Lock()
+        self.watcher = HotplugWatcher(self, poll_interval)
+        self.watcher.presence_changed.connect(self._on_presence_changed)
+
+    @property
+    def name(self):
+        if self.idVendor is None or self.idProduct is None:
+            return "usb"
+        return f"usb {self.idVendor:04x}:{self.idProduct:04x}"
+
+    def _check_ids(self):
+        if self.idVendor is None or self.idProduct is None:
+            raise ValueError("idVendor / idProduct de l'imprimante non configurés")
+
+    def _open(self):
+        return self.backend.open(self.idVendor, self.idProduct, self.printer_model)
+
+    @property
+    def stale(self):
+        return self._stale
+
+    def get_device(self):
+        """ Retourne la poignée de l'imprimante, ouverte au premier appel puis réutilisée.
+        Une poignée périmée est fermée et rouverte ici, dans le thread qui l'utilise """
+        with self._lock:
+            if self._stale:
+                self._stale = False
+                self._close(self._device)
+                self._device = None
+            if self._device is None:
+                self._check_ids()
+                self._device = self._open()
+            return self._device
+
+    def invalidate(self):
+        """ Ferme et oublie la poignée courante (imprimante en erreur). À n'appeler que depuis
+        le thread qui imprime, ou une fois celui-ci arrêté """
+        with self._lock:
+            device, self._device = self._device, None
+            self._stale = False
+        self._close(device)
+
+    def mark_stale(self):
+        """ Poignée à rouvrir, sans la fermer : une écriture peut être en cours dans le thread
+        d'impression, qui la fermera avant son prochain ticket """
+        with self._lock:
+            self._stale = self._device is not None
+
+    @staticmethod
+    def _close(device):
+        if device is not None:
+            try:
+                device.close()
+            except Exception:
+                pass
+
+    def present(self):
+        if self.idVendor is None or self.idProduct is None:
+            return False
+        return self.backend.present(self.idVendor, self.idProduct)
+
+    def write(self, device, data):
+        """ Envoie des octets ESC/POS ; le backend choisit le découpage adapté au transport """
+        write = getattr(self.backend, 'write', None)
+        if write is None:
+            device._raw(data)
+        else:
+            write(device, data)
+
+    def _on_presence_changed(self, present):
+        # La poignée précédente n'est plus valable après un débranchement / rebranchement
+        # (appelé dans le thread de l'interface, pendant qu'une impression peut être en cours)
+        self.mark_stale()
+        if present:
+            self.device_attached.emit()
+        else:
+            self.device_detached.emit()
+
+    def start_watching(self):
+        self.watcher.start()
+
+    def stop(self, timeout_ms=5000):
+        """ À appeler une fois le thread d'impression arrêté (la poignée est fermée ici) """
+        self.watcher.stop(timeout_ms)
+        self.invalidate()
+
+
+class NetworkDeviceManager(PrinterDeviceManager):
+    """ Imprimante réseau : même cycle de vie qu'une imprimante USB (poignée en cache,
+    invalidée en cas d'erreur), la présence étant vérifiée par une connexion TCP """
+
+    def __init__(self, host, port=9100, printer_model=None, backend=None, poll_interval=10, timeout=5):
+        super().__init__(None, None, printer_model, backend or NetworkBackend(timeout), poll_interval)
+        self.host = host
+        self.port = port
+
+    @property
+    def name(self):
+        return f"réseau {self.host}:{self.port}"
+
+    def _check_ids(self):
+        if not self.host:
+            raise ValueError("Adresse de l'imprimante réseau non configurée")
+
+    def _open(self):
+        return self.backend.open(self.host, self.port, self.printer_model)
+
+    def present(self):
+        if self._device is not None:
+            # Connexion déjà ouverte : beaucoup d'imprimantes n'acceptent qu'un client à la fois,
+            # une sonde TCP pourrait être refusée. Les erreurs sont détectées à l'écriture
+            return True
+        return self.backend.present(self.host, self.port)
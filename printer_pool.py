@@ -0,0 +1,80 @@
+import threading
+from print_functions import Printer
+from printer_status import PrinterStatusReporter
+from ticket_templates import TicketTemplateEngine
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger('printer')
+
+
+class PrinterPool:
+    """ Ensemble des imprimantes de la borne (USB et réseau).
+    Chaque imprimante a son propre thread d'impression (voir PrintQueue) : un ticket est pris
+    par la première imprimante libre et en état de marche, une imprimante en erreur ne prend
+    plus de tickets jusqu'à ce qu'elle réponde de nouveau.
+    L'état du pool est envoyé au serveur par un seul PrinterStatusReporter """
+
+    def __init__(self, web_url, request_executor, app_token, templates=None):
+        self.templates = templates or TicketTemplateEngine()
+        self.printers = []
+        self.states = {}  # nom de l'imprimante -> (erreur, message)
+        self._lock = threading.Lock()
+        # Un seul thread pour tous les envois d'état, quelle que soit la fréquence des changements
+        self.status_reporter = PrinterStatusReporter(web_url, request_executor, app_token)
+        self.status_reporter.start()
+        registry.gauge('kiosk_printers_available', "Imprimantes disponibles dans le pool",
+                       fn=lambda: len(self.available_printers()))
+
+    def add(self, device_manager):
+        printer = Printer(device_manager, self, self.templates)
+        self.printers.append(printer)
+        logger.info(f"Imprimante {printer.name} ajoutée au pool")
+        return printer
+
+    def available_printers(self):
+        return [printer for printer in self.printers if printer.available()]
+
+    @property
+    def error(self):
+        """ Le pool est en erreur quand plus aucune imprimante n'est disponible """
+        return not self.available_printers()
+
+    def initialize(self):
+        for printer in self.printers:
+            printer.initialize_printer()
+
+    def start_watching(self):
+        for printer in self.printers:
+            printer.device_manager.start_watching()
+
+    def set_app_token(self, app_token):
+        """ Le token arrive après la création du pool (démarrage en parallèle) """
+        self.status_reporter.app_token = app_token
+
+    def on_printer_status(self, printer, error, message):
+        """ État d'une imprimante : appelé depuis n'importe quel thread """
+        with self._lock:
+            self.states[printer.name] = (bool(error), message)
+            states = dict(self.states)
+        if len(self.printers) <= 1:
+            self.status_reporter.report(error, message)
+            return
+        failing = [f"{name} : {msg}" for name, (failed, msg) in states.items() if failed]
+        available = len(self.printers) - len(failing)
+        summary = f"{available}/{len(self.printers)} imprimante(s) disponible(s)"
+        if failing:
+            summary += " - " + " ; ".join(failing)
+        self.status_reporter.report(available == 0, summary)
+
+    def stop(self, timeout_ms=5000):
+        """ Arrête la surveillance des imprimantes et l'envoi d'état (attente bornée par thread,
+        0 = aucune attente). Retourne True si tous les threads sont arrêtés """
+        for printer in self.printers:
+            printer.stop(timeout_ms)
+        self.status_reporter.stop(timeout_ms)
+        return self.stopped()
+
+    def stopped(self):
+        threads = [printer.device_manager.watcher for printer in self.printers] + [self.status_reporter]
+        return not any(thread.isRunning() for thread in threads)
@@ -0,0 +1,107 @@
+import queue
+from requests.exceptions import RequestException
+from PySide6.QtCore import QThread, Signal
+from logging_setup import get_logger
+
+logger = get_logger('printer')
+
+
+class PrinterStatusReporter(QThread):
+    """ Thread unique qui envoie l'état de l'imprimante au serveur (/api/printer/status).
+    Les états identiques consécutifs sont fusionnés et, en cas de retard,
+    seul le dernier état connu est envoyé """
+    status_sent = Signal(bool, str)  # erreur, message
+
+    def __init__(self, web_url, request_executor, app_token, timeout=5, max_backoff=60, maxsize=20):
+        super().__init__()
+        self.web_url = web_url
+        self.request_executor = request_executor
+        self.app_token = app_token
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.states = queue.Queue(maxsize=maxsize)
+        self.last_sent = None
+        self._should_run = True
+
+    def report(self, error, message):
+        """ Appelé depuis n'importe quel thread, ne bloque jamais """
+        self._put_latest((bool(error), message))
+
+    def _put_latest(self, state):
+        while True:
+            try:
+                self.states.put_nowait(state)
+                return
+            except queue.Full:
+                # File pleine : on oublie l'état le plus ancien, seul le dernier compte
+                try:
+                    self.states.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _latest(self, state):
+        """ Vide la file et ne garde que l'état le plus récent """
+        while True:
+            try:
+                state = self.states.get_nowait()
+            except queue.Empty:
+                return state
+
+    def run(self):
+        state = None
+        while self._should_run:
+            if state is None:
+                state = self.states.get()
+            if state is None or not self._should_run:  # sentinelle d'arrêt
+                break
+            state = self._latest(state)
+            if state is None:
+                break
+            if state == self.last_sent:
+                state = None
+                continue
+            state = self._send_with_backoff(state)
+
+    def _send_with_backoff(self, state):
+        """ Envoie l'état, en réessayant avec un délai croissant.
+        Retourne None une fois envoyé, ou un état plus récent arrivé pendant l'attente """
+        delay = 1
+        while self._should_run:
+            if self._send(state):
+                self.last_sent = state
+                self.status_sent.emit(*state)
+                return None
+            try:
+                # Attente interrompue dès qu'un nouvel état arrive : inutile d'envoyer l'ancien
+                return self.states.get(timeout=delay)
+            except queue.Empty:
+                delay = min(delay * 2, self.max_backoff)
+        return None
+
+    def _send(self, state):
+        error, message = state
+        if not self.app_token:
+            # Token pas encore obtenu (démarrage en parallèle) : nouvel essai plus tard
+            return False
+        url = f'{self.web_url}/api/printer/status'
+        headers = {
+            'X-App-Token': self.app_token,
+            'Content-Type': 'application/json'
+        }
+        try:
+            # Pas de nouvelle tentative côté exécuteur : le délai croissant est géré ici
+            response = self.request_executor.post(url, json={'error': error, 'message': message},
+                                                  headers=headers, timeout=self.timeout,
+                                                  retries=0).result()
+        except RequestException as e:
+            logger.warning(f"Envoi de l'état de l'imprimante impossible : {e}")
+            return False
+        if response.status_code >= 500:
+            logger.warning(f"Envoi de l'état de l'imprimante refusé : {response.status_code}")
+            return False
+        return True
+
+    def stop(self, timeout_ms=None):
+        self._should_run = False
+        self._put_latest(None)  # sentinelle d'arrêt
+        return self.wait(self.timeout * 1000 + 1000 if timeout_ms is None else timeout_ms)
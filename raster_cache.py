@@ -0,0 +1,107 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger('print')
+
+RASTER_HITS = registry.counter('kiosk_raster_cache_hits_total', "Images de ticket servies par le cache")
+RASTER_MISSES = registry.counter('kiosk_raster_cache_misses_total', "Images de ticket rastérisées")
+
+# Largeur imprimable d'une TM-T88 en papier 80 mm (points)
+DEFAULT_MAX_WIDTH = 512
+# Hauteur maximale d'une bande GS v 0 : les grandes images sont envoyées en plusieurs bandes
+BAND_HEIGHT = 256
+
+
+def raster_bytes(image, max_width=DEFAULT_MAX_WIDTH, dither=True):
+    """ Image Pillow -> commandes ESC/POS GS v 0 (image matricielle, 1 bit par point) """
+    from PIL import Image, ImageOps
+
+    image = image.convert('L')
+    if image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height))
+    # En ESC/POS un bit à 1 est un point noir : on inverse avant de passer en 1 bit
+    image = ImageOps.invert(image).convert('1', dither=Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE)
+    width_bytes = (image.width + 7) // 8
+    data = image.tobytes()  # lignes complétées à l'octet par Pillow
+    parts = []
+    for top in range(0, image.height, BAND_HEIGHT):
+        rows = min(BAND_HEIGHT, image.height - top)
+        parts += [b'\x1dv0\x00',
+                  bytes([width_bytes & 0xFF, width_bytes >> 8, rows & 0xFF, rows >> 8]),
+                  data[top * width_bytes:(top + rows) * width_bytes]]
+    return b''.join(parts)
+
+
+class RasterCache:
+    """ Cache des images de ticket déjà converties en commandes ESC/POS.
+    La clé est l'empreinte du contenu et des réglages d'impression : un logo est rastérisé
+    une fois par démarrage, un même QR code n'est pas recalculé à chaque ticket.
+    Éviction LRU au-delà de maxsize entrées """
+
+    def __init__(self, maxsize=64, max_width=DEFAULT_MAX_WIDTH):
+        self.maxsize = maxsize
+        self.max_width = max_width
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, content, **settings):
+        digest = hashlib.sha256(kind.encode('utf-8'))
+        digest.update(content if isinstance(content, bytes) else content.encode('utf-8'))
+        digest.update(repr(sorted(settings.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                RASTER_HITS.inc()
+                return data
+        # Rastérisation hors verrou : une image lente ne bloque pas les autres tickets
+        data = render()
+        RASTER_MISSES.inc()
+        with self._lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return data
+
+    def image(self, path, dither=True):
+        """ Image d'un fichier (logo) ; la clé dépend du contenu, pas du chemin """
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        def render():
+            from PIL import Image
+            return raster_bytes(Image.open(io.BytesIO(content)), self.max_width, dither)
+        return self.get_or_render(self.key('image', content, width=self.max_width, dither=dither), render)
+
+    def qr(self, data, box_size=6, border=2):
+        def render():
+            import qrcode
+            code = qrcode.QRCode(box_size=box_size, border=border)
+            code.add_data(data)
+            code.make(fit=True)
+            return raster_bytes(code.make_image().get_image(), self.max_width, dither=False)
+        return self.get_or_render(self.key('qr', data, width=self.max_width, box_size=box_size,
+                                           border=border), render)
+
+    def barcode(self, data, symbology='code128', module_height=10):
+        def render():
+            import barcode
+            from barcode.writer import ImageWriter
+            code = barcode.get(symbology, data, writer=ImageWriter())
+            image = code.render({'module_height': module_height, 'write_text': True})
+            return raster_bytes(image, self.max_width, dither=False)
+        return self.get_or_render(self.key('barcode', data, width=self.max_width, symbology=symbology,
+                                           module_height=module_height), render)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+from collections import deque
+from PySide6.QtCore import QObject, QTimer, Signal
+from kiosk_scripts import KIOSK_WORLD
+from logging_setup import get_logger
+
+logger = get_logger('web')
+
+RENDERER_STATS_CALL = """
+JSON.stringify({
+    heap: (performance.memory ? performance.memory.usedJSHeapSize : null),
+    latency: (window.__kioskTakeInputLatency ? window.__kioskTakeInputLatency() : null)
+})
+"""
+
+
+def read_process_stats(pid):
+    """ Mémoire résidente (octets) et temps CPU cumulé (secondes) d'un processus, via /proc """
+    with open(f"/proc/{pid}/status", 'r') as f:
+        rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:')), 0)
+    with open(f"/proc/{pid}/stat", 'r') as f:
+        # Le nom du processus peut contenir des espaces : on découpe après la parenthèse fermante
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime + stime
+    return rss, cpu
+
+
+class ReloadPolicy(QObject):
+    """ Décide quand recharger la page à partir de l'état réel du moteur de rendu :
+    mémoire (RSS et tas JavaScript), CPU, latence entre un appui et l'affichage suivant,
+    et nombre de patients depuis le dernier rechargement.
+    Un rechargement n'est déclenché que pendant un temps mort (aucun appui récent) """
+    reload_planned = Signal(str)  # raison du rechargement
+
+    def __init__(self, web_view, sample_interval=30, max_rss_mb=800, max_js_heap_mb=300,
+                 max_cpu_percent=80, max_input_latency_ms=250, patient_before_reload=0,
+                 idle_seconds=20, min_reload_interval=600):
+        super().__init__()
+        self.web_view = web_view
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.max_js_heap = max_js_heap_mb * 1024 * 1024
+        self.max_cpu_percent = max_cpu_percent
+        self.max_input_latency_ms = max_input_latency_ms
+        self.patient_before_reload = patient_before_reload  # 0 = pas de limite
+        self.idle_seconds = idle_seconds
+        self.min_reload_interval = min_reload_interval
+
+        self.patients_counter = 0
+        self.pending_reason = None
+        self.last_reload = time.monotonic()
+        self.cpu_samples = deque(maxlen=3)  # le CPU doit rester élevé sur plusieurs mesures
+        self._last_cpu = None
+        self.last_sample = {}
+
+        self.sample_timer = QTimer(self)
+        self.sample_timer.timeout.connect(self.sample)
+        self.sample_timer.start(sample_interval * 1000)
+        # Vérification fréquente des temps morts, seulement quand un rechargement est en attente
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self.try_reload)
+
+    def on_page_reloaded(self):
+        """ Rechargement effectué (par cette politique ou demandé ailleurs) : compteurs remis à zéro """
+        self.last_reload = time.monotonic()
+        self.patients_counter = 0
+        self.cpu_samples.clear()
+        self._last_cpu = None
+
+    def record_patient(self, *args):
+        self.patients_counter += 1
+        if self.patient_before_reload and self.patients_counter >= self.patient_before_reload:
+            self.plan(f"{self.patients_counter} patients depuis le dernier rechargement")
+
+    def sample(self):
+        page = self.web_view.page()
+        pid = page.renderProcessPid()
+        if pid > 0:
+            try:
+                self._check_process(pid)
+            except (OSError, IndexError, ValueError) as e:
+                logger.debug(f"Lecture des statistiques du moteur de rendu impossible : {e}")
+        page.runJavaScript(RENDERER_STATS_CALL, KIOSK_WORLD, self._check_renderer_stats)
+
+    def _check_process(self, pid):
+        rss, cpu = read_process_stats(pid)
+        now = time.monotonic()
+        if self._last_cpu is not None and self._last_cpu[0] == pid:
+            elapsed = now - self._last_cpu[1]
+            if elapsed > 0:
+                self.cpu_samples.append(100 * (cpu - self._last_cpu[2]) / elapsed)
+        self._last_cpu = (pid, now, cpu)
+        self.last_sample.update({'pid': pid, 'rss': rss,
+                                 'cpu_percent': self.cpu_samples[-1] if self.cpu_samples else None})
+        if rss > self.max_rss:
+            self.plan(f"mémoire du moteur de rendu {rss // (1024 * 1024)} Mo")
+        elif len(self.cpu_samples) == self.cpu_samples.maxlen and min(self.cpu_samples) > self.max_cpu_percent:
+            self.plan(f"CPU du moteur de rendu {self.cpu_samples[-1]:.0f} %")
+
+    def _check_renderer_stats(self, result):
+        try:
+            stats = json.loads(result) if isinstance(result, str) else None
+        except json.JSONDecodeError:
+            stats = None
+        if not stats:
+            return
+        heap = stats.get('heap')
+        latency = stats.get('latency') or {}
+        self.last_sample.update({'js_heap': heap, 'input_latency': latency})
+        if heap and heap > self.max_js_heap:
+            self.plan(f"tas JavaScript {heap // (1024 * 1024)} Mo")
+        elif latency.get('count') and latency.get('avg', 0) > self.max_input_latency_ms:
+            self.plan(f"latence appui/affichage {latency['avg']:.0f} ms")
+
+    def plan(self, reason):
+        if self.pending_reason is None:
+            logger.info(f"Rechargement prévu au prochain temps mort : {reason}")
+            self.pending_reason = reason
+            self.idle_timer.start(2000)
+
+    def try_reload(self):
+        if self.pending_reason is None:
+            self.idle_timer.stop()
+            return
+        if time.monotonic() - self.last_reload < self.min_reload_interval:
+            return
+        if self.web_view.touch_telemetry.seconds_since_last_touch() < self.idle_seconds:
+            return  # un patient utilise la borne
+        reason, self.pending_reason = self.pending_reason, None
+        self.idle_timer.stop()
+        self.on_page_reloaded()
+        logger.warning(f"Rechargement de la page : {reason}")
+        self.reload_planned.emit(reason)
@@ -1,31 +1,75 @@
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from PySide6.QtCore import Signal, QThread
+from PySide6.QtCore import QObject, Signal
+from logging_setup import get_logger
 
-class RequestThread(QThread):
-    result = Signal(str, str, int)  # Correction du type de signal si nécessaire
+logger = get_logger('http')
 
-    def __init__(self, url, session, method='GET', data=None, json=None, headers=None):
+
+class RequestExecutor(QObject):
+    """ Exécuteur HTTP partagé par toute l'application.
+    Un pool de threads borne le nombre de requêtes en cours, la session garde les connexions
+    ouvertes (keep-alive) et chaque requête a un délai maximal et une politique de nouvelle tentative.
+    Le résultat est disponible via le Future retourné et via le signal finished """
+    finished = Signal(str, str, str, int)  # request_id, erreur, texte, code HTTP
+
+    def __init__(self, max_workers=4, timeout=10, retries=0, backoff_factor=0.5,
+                 retry_statuses=(502, 503, 504)):
         super().__init__()
-        self.url = url
-        self.session = session
-        self.method = method
-        self.data = data
-        self.json = json  # Ajout du paramètre json
-        self.headers = headers
-
-    def run(self):
-        print("Requesting URL:", self.url)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+        self.session = requests.Session()  # Session HTTP persistante
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http')
+
+    def request(self, method, url, timeout=None, retries=None, request_id=None, **kwargs):
+        """ Soumet une requête (GET, POST, PUT, DELETE...). Retourne un Future de la réponse """
+        request_id = request_id or uuid.uuid4().hex
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        future = self.pool.submit(self._execute, method, url, timeout, retries, **kwargs)
+        future.add_done_callback(lambda f: self._emit_result(request_id, f))
+        return future
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _execute(self, method, url, timeout, retries, **kwargs):
+        logger.debug("Requesting URL: %s %s", method, url)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in self.retry_statuses or attempt >= retries:
+                    return response
+            except RequestException:
+                if attempt >= retries:
+                    raise
+            time.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    def _emit_result(self, request_id, future):
         try:
-            if self.method == 'GET':
-                response = self.session.get(self.url, headers=self.headers)
-            elif self.method == 'POST':
-                if self.json:  # Si json est spécifié, l'utiliser pour l'envoi
-                    response = self.session.post(self.url, json=self.json, headers=self.headers)
-                else:
-                    response = self.session.post(self.url, data=self.data, headers=self.headers)
-            else:
-                raise ValueError(f"Méthode HTTP non supportée: {self.method}")
-            
-            self.result.emit("", response.text, response.status_code)
+            response = future.result()
         except RequestException as e:
-            self.result.emit(str(e), "", 0)
+            self.finished.emit(request_id, str(e), "", 0)
+            return
+        except Exception as e:
+            self.finished.emit(request_id, f"Erreur inattendue : {e}", "", 0)
+            return
+        self.finished.emit(request_id, "", response.text, response.status_code)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
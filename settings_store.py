@@ -0,0 +1,189 @@
+import queue
+from PySide6.QtCore import QObject, QThread, QSettings, QFileSystemWatcher, QTimer, Signal
+from logging_setup import get_logger
+
+logger = get_logger('settings')
+
+# Toutes les préférences de la borne : clé -> (type, valeur par défaut)
+SETTINGS_SCHEMA = {
+    'web_url': (str, "http://localhost:5000"),
+    'use_password': (bool, False),
+    'unlockpass': (str, ""),
+    'username': (str, "admin"),
+    'password': (str, "admin"),
+    'idVendor': (str, ""),
+    'idProduct': (str, ""),
+    'printer': (str, ""),
+    'network_printers': (str, ""),  # "hôte[:port], hôte[:port]"
+    'websocket_enabled': (bool, True),
+    'raw_print_enabled': (bool, True),  # le serveur peut envoyer des flux ESC/POS prêts à imprimer
+    'ticket_issue_path': (str, "/api/patient/issue_ticket"),  # émission directe depuis la page
+    'log_level': (str, "INFO"),
+    'pharmacy_name': (str, ""),
+    'ticket_header': (str, ""),  # lignes séparées par des retours à la ligne
+    'ticket_footer': (str, ""),
+    'ticket_logo': (str, ""),
+    # Table de caractères de l'imprimante (ESC t n) et encodage Python correspondant :
+    # dépend du modèle (PC858 = n° 19 sur les Epson TM-T88, n° 13 sur d'autres modèles)
+    'ticket_encoding': (str, "cp858"),
+    'ticket_codepage': (int, 19),
+    'metrics_port': (int, 9108),  # 0 = désactivé
+    'stall_threshold_ms': (int, 500),  # 0 = désactivé
+    'reload_mode': (str, "swap"),  # "swap" (double tampon) ou "direct"
+    'reload_max_rss_mb': (int, 800),
+    'reload_max_js_heap_mb': (int, 300),
+    'reload_max_cpu_percent': (int, 80),
+    'reload_max_input_latency_ms': (int, 250),
+    'reload_patient_limit': (int, 0),
+    'reload_idle_seconds': (int, 20),
+    'cache_policy': (str, "disk"),
+    'cache_size_mb': (int, 200),
+    'cache_prefetch': (bool, False),
+    'cache_prefetch_urls': (str, ""),
+}
+
+
+def coerce(value_type, value):
+    if value_type is str and isinstance(value, (list, tuple)):
+        # Valeur avec des virgules écrite sans guillemets dans le fichier INI (outils de la flotte) :
+        # QSettings la lit comme une liste
+        return ", ".join(str(item) for item in value)
+    if value_type is bool and isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'on')
+    return value_type(value)
+
+
+class SettingsWriter(QThread):
+    """ Écrit les préférences modifiées sur disque, hors du thread de l'interface.
+    Les modifications en attente sont regroupées en une seule écriture """
+    written = Signal(int)  # nombre de lots enregistrés
+
+    def __init__(self):
+        super().__init__()
+        self.changes = queue.Queue()
+
+    def run(self):
+        settings = QSettings()  # instance propre à ce thread
+        while True:
+            values = self.changes.get()
+            if values is None:  # sentinelle d'arrêt
+                break
+            batches = 1
+            while True:
+                try:
+                    more = self.changes.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self.changes.put(None)
+                    break
+                values.update(more)
+                batches += 1
+            for key, value in values.items():
+                settings.setValue(key, value)
+            settings.sync()
+            logger.debug(f"Préférences enregistrées : {', '.join(values)}")
+            self.written.emit(batches)
+
+    def stop(self):
+        self.changes.put(None)
+        self.wait(2000)
+
+
+class SettingsStore(QObject):
+    """ Préférences typées, lues une fois puis gardées en mémoire.
+    Chaque modification émet changed(clé, valeur), puis changes_applied(clés) une fois par lot :
+    chaque sous-système ne se reconstruit que si ses propres clés ont changé.
+    L'écriture sur disque est asynchrone ; le fichier peut être surveillé pour appliquer
+    les modifications poussées par les outils de la flotte """
+    changed = Signal(str, object)
+    changes_applied = Signal(list)
+
+    def __init__(self, schema=SETTINGS_SCHEMA):
+        super().__init__()
+        self.schema = schema
+        self.values = {}
+        self._pending_writes = 0
+        self.writer = SettingsWriter()
+        self.writer.written.connect(self._on_written)
+        self.writer.start()
+        self.watcher = None
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(500)
+        self._reload_timer.timeout.connect(self.reload)
+
+    def _read(self, settings):
+        values = {}
+        for key, (value_type, default) in self.schema.items():
+            try:
+                values[key] = coerce(value_type, settings.value(key, default))
+            except (TypeError, ValueError):
+                logger.warning(f"Préférence {key} invalide, valeur par défaut utilisée")
+                values[key] = default
+        return values
+
+    def load(self):
+        self.values = self._read(QSettings())
+        return self
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        return self.update({key: value})
+
+    def update(self, values):
+        """ Applique et enregistre des préférences. Retourne la liste des clés modifiées """
+        return self._apply(values, persist=True)
+
+    def _apply(self, values, persist=False):
+        changed = []
+        for key, value in values.items():
+            value_type = self.schema.get(key, (type(value), None))[0]
+            value = coerce(value_type, value)
+            if self.values.get(key) != value:
+                self.values[key] = value
+                changed.append(key)
+        if changed and persist:
+            self._pending_writes += 1
+            self.writer.changes.put({key: self.values[key] for key in changed})
+        for key in changed:
+            self.changed.emit(key, self.values[key])
+        if changed:
+            logger.info(f"Préférences modifiées : {', '.join(changed)}")
+            self.changes_applied.emit(changed)
+        return changed
+
+    def _on_written(self, batches):
+        self._pending_writes = max(0, self._pending_writes - batches)
+
+    def watch(self):
+        """ Surveille le fichier de préférences (modifié par un outil externe) """
+        path = QSettings().fileName()
+        self.watcher = QFileSystemWatcher(self)
+        if not self.watcher.addPath(path):
+            logger.debug(f"Surveillance des préférences impossible : {path}")
+            return
+        self.watcher.fileChanged.connect(self._on_file_changed)
+
+    def _on_file_changed(self, path):
+        # Un fichier remplacé (écriture atomique) n'est plus surveillé : on le réajoute
+        if path not in self.watcher.files():
+            self.watcher.addPath(path)
+        self._reload_timer.start()
+
+    def reload(self):
+        if self._pending_writes:
+            # Nos propres écritures ne sont pas terminées : le fichier n'est pas encore à jour
+            self._reload_timer.start()
+            return
+        settings = QSettings()
+        settings.sync()
+        self._apply(self._read(settings))
+
+    def stop(self):
+        self.writer.stop()
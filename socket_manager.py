@@ -0,0 +1,102 @@
+from PySide6.QtCore import QObject, Signal
+from websocket_client import WebSocketClient
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger('socket')
+
+
+class SocketConnectionManager(QObject):
+    """ Propriétaire unique du client WebSocket : jamais plus d'un thread ni d'une connexion.
+    configure() compare les nouveaux réglages aux réglages en cours et ne reconnecte
+    que si l'URL ou l'activation ont changé ; un nouveau token est simplement transmis
+    au client, qui l'utilisera à sa prochaine connexion """
+    signal_print = Signal(object, str)  # relais de WebSocketClient.signal_print
+    signal_print_batch = Signal(list)
+    connected = Signal()
+    connection_state_changed = Signal(str)
+
+    def __init__(self, client_factory=WebSocketClient):
+        super().__init__()
+        self.client_factory = client_factory
+        self.client = None
+        self.url = None
+        self.enabled = False
+        self.token = None
+        self.capabilities = None
+        self._stopping = set()  # anciens clients dont le thread n'est pas encore terminé
+        registry.gauge('kiosk_socket_clients', "Clients WebSocket actifs (0 ou 1)",
+                       fn=lambda: int(self.client is not None))
+
+    @property
+    def state(self):
+        if self.client is None:
+            return 'disabled'
+        return self.client.state
+
+    def configure(self, url, enabled, token=None, capabilities=None):
+        """ Applique les réglages. Retourne True si un nouveau client a été démarré.
+        Les capacités sont annoncées à la connexion : les modifier impose de se reconnecter """
+        if token != self.token:
+            self.token = token
+            if self.client is not None:
+                self.client.token = token
+        if not enabled:
+            self.enabled = False
+            self.stop()
+            return False
+        if self.client is not None and url == self.url and capabilities == self.capabilities:
+            logger.debug("Réglages WebSocket inchangés, connexion conservée")
+            return False
+        previous = self.client
+        self.stop()
+        self.url = url
+        self.capabilities = capabilities
+        self.enabled = True
+        self.client = self._create_client(url, previous)
+        logger.info(f"Démarrage du client Socket.IO : {url}")
+        self.client.start()
+        return True
+
+    def _create_client(self, url, previous=None):
+        client = self.client_factory(url, token=self.token, capabilities=self.capabilities)
+        if previous is not None and previous.web_url == client.web_url:
+            # Même serveur : l'historique de livraison est conservé (pas de double impression)
+            client.processed_ids = previous.processed_ids
+            client.last_seq = previous.last_seq
+        client.signal_print.connect(self.signal_print)
+        client.signal_print_batch.connect(self.signal_print_batch)
+        client.connected.connect(self.connected)
+        client.connection_state_changed.connect(self.connection_state_changed)
+        return client
+
+    def acknowledge(self, job_id, success, error=None):
+        if self.client is not None:
+            self.client.acknowledge(job_id, success, error)
+
+    def stop(self):
+        client, self.client = self.client, None
+        if client is None:
+            return
+        logger.info("Arrêt du client Socket.IO")
+        # Attente bornée : l'interface ne se fige pas si la déconnexion traîne
+        stopped = client.stop()
+        client.signal_print.disconnect(self.signal_print)
+        client.signal_print_batch.disconnect(self.signal_print_batch)
+        client.connected.disconnect(self.connected)
+        client.connection_state_changed.disconnect(self.connection_state_changed)
+        if stopped:
+            client.deleteLater()
+        else:
+            # L'arrêt est demandé, le client se termine seul : libéré à la fin de son thread
+            logger.warning("Le client Socket.IO ne s'est pas arrêté à temps, arrêt en arrière-plan")
+            self._stopping.add(client)
+            client.finished.connect(lambda: self._on_client_finished(client))
+            if client.isFinished():
+                self._on_client_finished(client)
+        self.connection_state_changed.emit('disabled')
+
+    def _on_client_finished(self, client):
+        if client in self._stopping:
+            self._stopping.discard(client)
+            client.deleteLater()
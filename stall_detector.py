@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import threading
+import traceback
+from PySide6.QtCore import QObject, QTimer
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger('stall')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STALLS = registry.counter('kiosk_event_loop_stalls_total', "Blocages de la boucle Qt détectés")
+STALL_DURATION = registry.histogram('kiosk_event_loop_stall_seconds', "Durée des blocages de la boucle Qt",
+                                    (0.25, 0.5, 1, 2, 5, 10, 30, 60))
+
+
+def call_site(frames):
+    """ Dernier appel situé dans le code de la borne (sinon le plus profond) : c'est en général
+    lui qui a lancé l'opération bloquante (impression, lecture des préférences, requête...) """
+    for frame in reversed(frames):
+        if os.path.abspath(frame.filename).startswith(APP_DIR):
+            return frame
+    return frames[-1] if frames else None
+
+
+class StallDetector(QObject):
+    """ Détecteur de blocage de l'interface tactile.
+    Un minuteur rapide du thread principal met à jour un battement ; un thread de surveillance
+    vérifie qu'il progresse. Au-delà du seuil, la pile Python du thread principal est capturée
+    (sys._current_frames) et l'appel bloquant est journalisé avec la durée du blocage """
+
+    def __init__(self, threshold=0.5, heartbeat_ms=50, check_interval=0.1):
+        super().__init__()
+        self.threshold = threshold
+        self.check_interval = check_interval
+        self.main_thread_id = threading.get_ident()  # créé dans le thread de l'interface
+        self._last_beat = time.monotonic()
+        self._stack = None  # pile capturée pendant le blocage en cours
+        self._stop_event = threading.Event()
+        self.thread = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(heartbeat_ms)
+        self.timer.timeout.connect(self._beat)
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self.timer.start()
+        self.thread = threading.Thread(target=self._monitor, name="stall-detector", daemon=True)
+        self.thread.start()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def _monitor(self):
+        stalled_since = None
+        while not self._stop_event.wait(self.check_interval):
+            last_beat = self._last_beat
+            lag = time.monotonic() - last_beat
+            if lag > self.threshold:
+                if stalled_since != last_beat:
+                    # Nouveau blocage : capture de la pile pendant qu'il est en cours
+                    stalled_since = last_beat
+                    self._capture(lag)
+            elif stalled_since is not None:
+                self._report(last_beat - stalled_since)
+                stalled_since = None
+
+    def _capture(self, lag):
+        frame = sys._current_frames().get(self.main_thread_id)
+        if frame is None:
+            return
+        self._stack = traceback.extract_stack(frame)
+        del frame
+        site = call_site(self._stack)
+        STALLS.inc()
+        logger.warning(f"Boucle Qt bloquée depuis {lag:.2f} s, appel en cours : "
+                       f"{site.filename}:{site.lineno} ({site.name})\n"
+                       + ''.join(traceback.format_list(self._stack)))
+
+    def _report(self, duration):
+        STALL_DURATION.observe(duration)
+        site = call_site(self._stack) if self._stack else None
+        where = f"{os.path.basename(site.filename)}:{site.lineno} ({site.name})" if site else "inconnu"
+        logger.warning(f"Fin du blocage de la boucle Qt après {duration:.2f} s, causé par {where}")
+        self._stack = None
+
+    def stop(self):
+        self.timer.stop()
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join(1)
@@ -0,0 +1,93 @@
+import json
+import time
+import threading
+from datetime import datetime
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+from logging_setup import get_logger
+
+logger = get_logger('startup')
+
+
+class StartupPipeline(QObject):
+    """ Démarrage de l'application par phases concurrentes (token, imprimante, WebSocket...).
+    Chaque phase est chronométrée ; le rapport est ajouté à startup_timing.log
+    quand toutes les phases sont terminées (ou au bout du délai maximal) """
+    phase_finished = Signal(str, bool, float)  # nom, succès, durée en secondes
+    finished = Signal(dict)
+    _phase_done = Signal(str, bool, object)
+
+    def __init__(self, log_path='startup_timing.log', deadline=60):
+        super().__init__()
+        self.log_path = log_path
+        self.t0 = time.perf_counter()
+        self.phases = {}
+        self._callbacks = {}
+        self._reported = False
+        self._phase_done.connect(self._on_phase_done)
+        # Le rapport est écrit même si une phase ne se termine jamais (serveur injoignable...)
+        QTimer.singleShot(deadline * 1000, self.report)
+
+    def _now(self):
+        return time.perf_counter() - self.t0
+
+    def start_phase(self, name):
+        if self._reported:  # après le démarrage (reconnexion...), plus rien à mesurer
+            return
+        self.phases[name] = {'start': self._now(), 'duration': None, 'success': None}
+
+    def end_phase(self, name, success=True):
+        phase = self.phases.get(name)
+        if phase is None or phase['duration'] is not None:
+            return
+        phase['duration'] = self._now() - phase['start']
+        phase['success'] = success
+        logger.info(f"Démarrage - {name} : {phase['duration']:.3f} s ({'OK' if success else 'échec'})")
+        self.phase_finished.emit(name, success, phase['duration'])
+        if all(p['duration'] is not None for p in self.phases.values()):
+            self.report()
+
+    def run_in_thread(self, name, fn, on_result=None):
+        """ Exécute fn hors du thread de l'interface ; on_result(résultat) est appelé
+        ensuite dans le thread de l'interface (None si fn a levé une exception) """
+        self.start_phase(name)
+        self._callbacks[name] = on_result
+
+        def target():
+            try:
+                result = fn()
+                self._phase_done.emit(name, True, result)
+            except Exception as e:
+                logger.error(f"Démarrage - erreur dans la phase {name} : {e}")
+                self._phase_done.emit(name, False, None)
+
+        threading.Thread(target=target, name=f"startup-{name}", daemon=True).start()
+
+    @Slot(str, bool, object)
+    def _on_phase_done(self, name, success, result):
+        callback = self._callbacks.pop(name, None)
+        if callback is not None:
+            callback(result)
+        self.end_phase(name, success)
+
+    def report(self):
+        if self._reported:
+            return
+        self._reported = True
+        record = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'total': round(self._now(), 3),
+            'phases': {
+                name: {
+                    'start': round(p['start'], 3),
+                    'duration': None if p['duration'] is None else round(p['duration'], 3),
+                    'success': p['success'],
+                }
+                for name, p in self.phases.items()
+            },
+        }
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logger.error(f"Écriture du rapport de démarrage impossible : {e}")
+        self.finished.emit(record)
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+import pytest
+
+# Modules de la borne à la racine du dépôt ; Qt sans écran
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    QtCore = pytest.importorskip("PySide6.QtCore")
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def process_events(app, seconds):
+    """ Fait tourner la boucle Qt pendant la durée donnée (minuteurs, signaux entre threads) """
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+
+
+def wait_until(app, predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
@@ -0,0 +1,76 @@
+import time
+import pytest
+from conftest import wait_until
+
+pytest.importorskip("PySide6")
+pytest.importorskip("escpos")
+from printer_device import (FakeBackend, FakeNetworkPrinter, NetworkBackend, NetworkDeviceManager,
+                            PrinterDeviceManager)
+from printer_pool import PrinterPool
+from print_queue import PrintQueue
+from print_spool import PrintSpool, RawTicket
+from request_handler import RequestExecutor
+
+
+@pytest.fixture
+def network_printer():
+    printer = FakeNetworkPrinter().start()
+    yield printer
+    printer.stop()
+
+
+@pytest.fixture
+def executor():
+    executor = RequestExecutor()
+    yield executor
+    executor.shutdown()
+
+
+def test_presence_probe(network_printer):
+    backend = NetworkBackend(timeout=1)
+    assert backend.present(network_printer.host, network_printer.port)
+    network_printer.stop()
+    assert not backend.present(network_printer.host, network_printer.port)
+
+
+def test_prints_over_tcp(qapp, executor, network_printer):
+    pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    printer = pool.add(NetworkDeviceManager(network_printer.host, network_printer.port,
+                                            backend=NetworkBackend(timeout=1)))
+    try:
+        assert printer.print(RawTicket(b"ticket-1"))
+        assert printer.print(RawTicket(b"ticket-2"))
+        assert wait_until(qapp, lambda: bytes(network_printer.received) == b"ticket-1ticket-2")
+        assert len(network_printer.connections) == 1  # connexion conservée entre deux tickets
+    finally:
+        pool.stop()
+
+
+def test_fails_over_when_network_printer_goes_down(qapp, executor, network_printer, tmp_path):
+    pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    pool.add(NetworkDeviceManager(network_printer.host, network_printer.port,
+                                  backend=NetworkBackend(timeout=1)))
+    usb = FakeBackend()
+    pool.add(PrinterDeviceManager("0001", "0001", None, backend=usb))
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    print_queue = PrintQueue(pool, spool, retry_interval=0.2)
+    network_worker, usb_worker = print_queue.workers
+    try:
+        network_worker.start()
+        print_queue.submit(RawTicket(b"srv-1;"), "srv-1")
+        assert wait_until(qapp, lambda: spool.is_done("srv-1"))
+
+        # Imprimante réseau éteinte : le ticket suivant échoue et part sur l'autre imprimante
+        network_printer.stop()
+        time.sleep(0.2)
+        print_queue.submit(RawTicket(b"srv-2;"), "srv-2")
+        assert wait_until(qapp, lambda: network_worker.printer.error)
+        usb_worker.start()
+
+        assert wait_until(qapp, lambda: spool.is_done("srv-2"))
+        assert bytes(network_printer.received) == b"srv-1;"
+        assert bytes(usb.devices[0].output) == b"srv-2;"
+    finally:
+        print_queue.stop()
+        spool.close()
+        pool.stop()
@@ -0,0 +1,69 @@
+import pytest
+from conftest import wait_until
+
+pytest.importorskip("PySide6")
+pytest.importorskip("escpos")
+from printer_device import FakeBackend, PrinterDeviceManager
+from printer_pool import PrinterPool
+from print_queue import PrintQueue
+from print_spool import PrintSpool, RawTicket
+from request_handler import RequestExecutor
+
+
+def test_tickets_over_queue_size_are_printed_in_order(qapp, tmp_path):
+    executor = RequestExecutor()
+    backend = FakeBackend(latency=0.05)
+    pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    pool.add(PrinterDeviceManager("0001", "0001", None, backend=backend))
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    print_queue = PrintQueue(pool, spool, maxsize=2, retry_interval=0.2)
+    try:
+        print_queue.start()
+        job_ids = [print_queue.submit(RawTicket(f"srv-{n};".encode()), f"srv-{n}") for n in range(6)]
+        # Renvoi par le serveur d'un ticket en attente : pas de second ticket
+        print_queue.submit(RawTicket(b"srv-5;"), "srv-5")
+
+        assert wait_until(qapp, lambda: all(spool.is_done(job_id) for job_id in job_ids))
+        assert bytes(backend.devices[0].output) == b"".join(f"srv-{n};".encode() for n in range(6))
+        assert not print_queue.overflow
+    finally:
+        print_queue.stop()
+        spool.close()
+        pool.stop()
+        executor.shutdown()
+
+
+def test_rebuild_does_not_reprint_ticket_in_flight(qapp, tmp_path):
+    executor = RequestExecutor()
+    old_backend, new_backend = FakeBackend(latency=0.5), FakeBackend()
+    old_pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    old_pool.add(PrinterDeviceManager("0001", "0001", None, backend=old_backend))
+    new_pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    new_pool.add(PrinterDeviceManager("0001", "0001", None, backend=new_backend))
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    old_queue = PrintQueue(old_pool, spool, retry_interval=0.2)
+    new_queue = PrintQueue(new_pool, spool, retry_interval=0.2)
+    try:
+        old_queue.start()
+        old_queue.submit(RawTicket(b"srv-1;"), "srv-1")
+        old_queue.submit(RawTicket(b"srv-2;"), "srv-2")
+        assert wait_until(qapp, lambda: old_queue.workers[0].current_ids)
+
+        # Arrêt sans attente pendant l'écriture de srv-1, comme rebuild_printers
+        assert not old_queue.stop(timeout_ms=0)
+        held = old_queue.in_flight()
+        assert held == {"srv-1"}
+        new_queue.start(held)
+        assert wait_until(qapp, old_queue.stopped)
+        new_queue.adopt(held)
+
+        assert wait_until(qapp, lambda: spool.is_done("srv-1") and spool.is_done("srv-2"))
+        assert bytes(old_backend.devices[0].output) == b"srv-1;"
+        assert bytes(new_backend.devices[0].output) == b"srv-2;"
+    finally:
+        old_queue.stop()
+        new_queue.stop()
+        spool.close()
+        old_pool.stop()
+        new_pool.stop()
+        executor.shutdown()
@@ -0,0 +1,81 @@
+from print_spool import PrintSpool, RawTicket, job_from_message, new_job_id
+
+
+def test_server_id_is_deduplicated(tmp_path):
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    assert spool.add("srv-1", "ticket")
+    assert not spool.add("srv-1", "ticket")
+    spool.mark_done("srv-1")
+    assert not spool.add("srv-1", "ticket")
+
+
+def test_identical_tickets_without_server_id_are_kept(tmp_path):
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    assert spool.add(new_job_id(), "même ticket")
+    assert spool.add(new_job_id(), "même ticket")
+    assert len(spool.pending_jobs()) == 2
+
+
+def test_failures_survive_restart(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    spool = PrintSpool(path)
+    spool.add("a", RawTicket(b"\x1b@ticket"))
+    assert spool.record_failures("a") == [1]
+    assert spool.record_failures("a") == [2]
+    spool.close()
+
+    reloaded = PrintSpool(path)
+    assert reloaded.pending_jobs() == [{'id': "a", 'data': RawTicket(b"\x1b@ticket")}]
+    assert reloaded.record_failures("a") == [3]
+    reloaded.close()
+    # Le compteur est conservé par la compaction du journal
+    assert PrintSpool(path).attempts == {"a": 3}
+
+
+def test_abandoned_ticket_is_not_replayed(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    spool = PrintSpool(path)
+    spool.add("a", "ticket")
+    spool.add("b", "ticket")
+    spool.record_failures("a")
+    spool.mark_done("a", error="ticket illisible")
+    spool.close()
+
+    reloaded = PrintSpool(path, compact_every=1)
+    assert [job['id'] for job in reloaded.pending_jobs()] == ["b"]
+    assert reloaded.is_done("a")
+    assert "a" not in reloaded.attempts
+
+
+def test_job_from_message_keeps_server_id_only():
+    assert job_from_message({'data': "dGlja2V0", 'job_id': 42}) == ("dGlja2V0", "42")
+    assert job_from_message({'data': "dGlja2V0"}) == ("dGlja2V0", None)
+    fields = {'template': 'default', 'fields': {'number': 7}}
+    assert job_from_message(dict(fields, id="t-7")) == (fields, "t-7")
+
+
+def test_add_does_not_wait_for_disk(tmp_path, monkeypatch):
+    path = str(tmp_path / "spool.jsonl")
+    spool = PrintSpool(path)
+    synced = []
+    monkeypatch.setattr("print_spool.os.fsync", lambda fd: synced.append(fd))
+    for number in range(20):
+        spool.add(f"srv-{number}", "ticket")
+    # Les enregistrements sont écrits par le thread du journal, regroupés
+    assert spool.flush()
+    assert 1 <= len(synced) <= 20
+    spool.close()
+    assert len(PrintSpool(path).pending_jobs()) == 20
+
+
+def test_background_compaction_keeps_state(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    spool = PrintSpool(path, compact_every=5)
+    for number in range(12):
+        spool.add(f"srv-{number}", "ticket")
+        if number % 2:
+            spool.mark_done(f"srv-{number}")
+    spool.close()
+    reloaded = PrintSpool(path)
+    assert [job['id'] for job in reloaded.pending_jobs()] == [f"srv-{n}" for n in range(0, 12, 2)]
+    assert all(reloaded.is_done(f"srv-{n}") for n in range(1, 12, 2))
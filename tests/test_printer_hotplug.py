@@ -0,0 +1,83 @@
+import pytest
+from conftest import wait_until
+
+pytest.importorskip("PySide6")
+pytest.importorskip("escpos")
+from printer_device import FakeBackend, PrinterDeviceManager
+from printer_pool import PrinterPool
+from print_queue import PrintQueue
+from print_spool import PrintSpool, RawTicket
+from request_handler import RequestExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = RequestExecutor()
+    yield executor
+    executor.shutdown()
+
+
+def make_pool(executor, *backends):
+    pool = PrinterPool("http://127.0.0.1:1", executor, None)
+    for index, backend in enumerate(backends):
+        pool.add(PrinterDeviceManager(f"{index + 1:04x}", "0001", None, backend=backend))
+    return pool
+
+
+def test_detach_does_not_close_handle_in_use(qapp):
+    backend = FakeBackend()
+    manager = PrinterDeviceManager("04b8", "0e15", None, backend=backend)
+    device = manager.get_device()
+
+    # Signalé dans le thread de l'interface pendant qu'une écriture peut être en cours
+    manager._on_presence_changed(False)
+    assert not device.closed
+    manager._on_presence_changed(True)
+
+    # Fermée puis rouverte par le thread qui imprime
+    reopened = manager.get_device()
+    assert device.closed
+    assert reopened is not device
+
+
+def test_printer_reopens_after_replug(qapp, executor):
+    backend = FakeBackend()
+    pool = make_pool(executor, backend)
+    printer = pool.printers[0]
+    try:
+        assert printer.print(RawTicket(b"ticket-1"))
+        printer.device_manager._on_presence_changed(False)
+        assert not printer.available()
+        printer.device_manager._on_presence_changed(True)
+
+        assert printer.print(RawTicket(b"ticket-2"))
+        assert printer.available()
+        first, second = backend.devices
+        assert first.closed and bytes(first.output) == b"ticket-1"
+        assert bytes(second.output) == b"ticket-2"
+    finally:
+        pool.stop()
+
+
+def test_failed_ticket_moves_to_other_printer(qapp, executor, tmp_path):
+    broken = FakeBackend(failure_rate=1.0)
+    working = FakeBackend()
+    pool = make_pool(executor, broken, working)
+    spool = PrintSpool(str(tmp_path / "spool.jsonl"))
+    print_queue = PrintQueue(pool, spool, retry_interval=0.2)
+    first, second = print_queue.workers
+    try:
+        # Seule l'imprimante en panne prend le ticket, puis l'autre démarre
+        first.start()
+        job_id = print_queue.submit(RawTicket(b"ticket"))
+        assert wait_until(qapp, lambda: first.printer.error)
+        second.start()
+
+        assert wait_until(qapp, lambda: spool.is_done(job_id))
+        assert broken.bytes_written == 0
+        assert bytes(working.devices[0].output) == b"ticket"
+        assert spool.attempts == {}
+    finally:
+        print_queue.stop()
+        spool.close()
+        pool.stop()
@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("PySide6")
+from reload_policy import ReloadPolicy
+
+
+class IdleClock:
+    """ Télémétrie tactile réduite à l'ancienneté du dernier appui """
+
+    def __init__(self, idle=0.0):
+        self.idle = idle
+
+    def seconds_since_last_touch(self):
+        return self.idle
+
+
+class WebView:
+
+    def __init__(self):
+        self.touch_telemetry = IdleClock()
+
+
+@pytest.fixture
+def policy(qapp):
+    view = WebView()
+    policy = ReloadPolicy(view, patient_before_reload=3, idle_seconds=20, min_reload_interval=0)
+    policy.planned = []
+    policy.reload_planned.connect(policy.planned.append)
+    yield policy
+    policy.sample_timer.stop()
+    policy.idle_timer.stop()
+
+
+def test_patient_threshold_plans_one_reload_during_idle_gap(policy):
+    for _ in range(5):
+        policy.record_patient()
+    assert policy.pending_reason is not None
+
+    # Un patient utilise la borne : le rechargement attend
+    policy.web_view.touch_telemetry.idle = 5
+    policy.try_reload()
+    assert policy.planned == []
+
+    # Temps mort : un seul rechargement, même si le seuil a été dépassé plusieurs fois
+    policy.web_view.touch_telemetry.idle = 30
+    policy.try_reload()
+    policy.try_reload()
+    assert len(policy.planned) == 1
+    assert policy.pending_reason is None
+    assert policy.patients_counter == 0
+
+
+def test_below_threshold_plans_nothing(policy):
+    policy.web_view.touch_telemetry.idle = 30
+    for _ in range(2):
+        policy.record_patient()
+    policy.try_reload()
+    assert policy.pending_reason is None
+    assert policy.planned == []
+
+
+def test_page_reload_resets_patient_count(policy):
+    policy.record_patient()
+    policy.record_patient()
+    policy.on_page_reloaded()
+    policy.record_patient()
+    assert policy.pending_reason is None
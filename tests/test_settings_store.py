@@ -0,0 +1,38 @@
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+from settings_store import SettingsStore, coerce
+
+
+@pytest.fixture
+def settings_file(qapp, tmp_path):
+    QSettings = QtCore.QSettings
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, str(tmp_path))
+    qapp.setOrganizationName("PharmaFileTest")
+    qapp.setApplicationName("PatientPageTest")
+    return QSettings().fileName()
+
+
+def test_comma_values_pushed_by_fleet_tooling(settings_file):
+    # Fichier INI modifié à la main ou par un outil : valeurs avec virgules sans guillemets
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        f.write("[General]\n"
+                "network_printers=10.0.0.5:9100, 10.0.0.6\n"
+                "cache_prefetch_urls=/static/a.js, /static/b.css\n"
+                "metrics_port=9200\n"
+                "websocket_enabled=false\n")
+    store = SettingsStore().load()
+    try:
+        assert store["network_printers"] == "10.0.0.5:9100, 10.0.0.6"
+        assert store["cache_prefetch_urls"] == "/static/a.js, /static/b.css"
+        assert store["metrics_port"] == 9200
+        assert store["websocket_enabled"] is False
+    finally:
+        store.stop()
+
+
+def test_coerce_joins_lists_for_text_settings():
+    assert coerce(str, ["a", "b"]) == "a, b"
+    assert coerce(str, "a") == "a"
+    assert coerce(int, "12") == 12
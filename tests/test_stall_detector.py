@@ -0,0 +1,45 @@
+import time
+import logging
+import pytest
+from conftest import process_events
+
+pytest.importorskip("PySide6")
+import stall_detector
+from stall_detector import StallDetector
+
+
+def blocking_print_call():
+    # Opération bloquante exécutée dans le thread de l'interface
+    time.sleep(0.6)
+
+
+def test_stall_stack_names_blocking_call(qapp, caplog):
+    detector = StallDetector(threshold=0.2, heartbeat_ms=20, check_interval=0.05)
+    stalls = stall_detector.STALLS.value
+    detector.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger='kiosk.stall'):
+            process_events(qapp, 0.1)
+            blocking_print_call()
+            process_events(qapp, 0.3)
+    finally:
+        detector.stop()
+
+    messages = [record.getMessage() for record in caplog.records]
+    captured = [m for m in messages if "appel en cours" in m]
+    ended = [m for m in messages if "Fin du blocage" in m]
+    assert len(captured) == 1
+    assert "blocking_print_call" in captured[0].splitlines()[0]
+    assert len(ended) == 1 and "blocking_print_call" in ended[0]
+    assert stall_detector.STALLS.value == stalls + 1
+
+
+def test_no_stall_while_loop_runs(qapp, caplog):
+    detector = StallDetector(threshold=0.2, heartbeat_ms=20, check_interval=0.05)
+    detector.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger='kiosk.stall'):
+            process_events(qapp, 0.5)
+    finally:
+        detector.stop()
+    assert not [r for r in caplog.records if r.name == 'kiosk.stall']
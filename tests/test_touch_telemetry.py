@@ -0,0 +1,17 @@
+import touch_telemetry
+from touch_telemetry import TouchTelemetry
+
+
+def test_gap_on_bucket_boundary_goes_to_next_bucket(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(touch_telemetry.time, 'monotonic', lambda: now[0])
+    telemetry = TouchTelemetry()
+    for t in (0.0, 0.5, 1.5):
+        now[0] = t
+        telemetry.record(0)
+    now[0] = 2.0
+    gaps = telemetry.snapshot()['gaps']
+    # 0.5 s n'est pas "<0.5s", 1.0 s n'est pas "<1s"
+    assert gaps['<0.5s'] == 0
+    assert gaps['<1s'] == 1
+    assert gaps['<5s'] == 1
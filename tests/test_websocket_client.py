@@ -0,0 +1,106 @@
+import pytest
+from conftest import wait_until
+
+pytest.importorskip("PySide6")
+pytest.importorskip("socketio")
+pytest.importorskip("aiohttp")
+from fake_socket_server import FakeSocketServer
+from websocket_client import WebSocketClient
+
+TICKET = "VGlja2V0"  # texte base64 (ancien format)
+
+
+class Kiosk:
+    """ Côté borne : imprime (compte) les tickets reçus et confirme, sauf ceux marqués 'slow'
+    (imprimante bloquée) ou 'bad' (ticket illisible, abandonné) """
+
+    def __init__(self, client):
+        self.client = client
+        self.printed = []
+        client.signal_print.connect(self.print_ticket)
+        client.signal_print_batch.connect(self.print_batch)
+
+    def print_ticket(self, data, job_id):
+        self.printed.append(job_id)
+        if job_id.startswith('bad'):
+            self.client.acknowledge(job_id, False, "ticket illisible")
+        elif not job_id.startswith('slow'):
+            self.client.acknowledge(job_id, True)
+
+    def print_batch(self, jobs):
+        for data, job_id in jobs:
+            self.print_ticket(data, job_id)
+
+
+@pytest.fixture
+def server():
+    server = FakeSocketServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def kiosk(qapp, server):
+    client = WebSocketClient(server.url, ack_timeout=0.5, ping_interval=3600)
+    kiosk = Kiosk(client)
+    client.start()
+    assert wait_until(qapp, server.client_connected.is_set)
+    yield kiosk
+    client.stop()
+
+
+def send(qapp, server, payload):
+    """ Envoie un message et retourne l'accusé de réception de la borne """
+    count = len(server.acks)
+    server.emit_update(payload)
+    assert wait_until(qapp, lambda: len(server.acks) > count)
+    return server.acks[-1][1]
+
+
+def test_ack_after_print_then_duplicate_on_redelivery(qapp, server, kiosk):
+    ack = send(qapp, server, {'job_id': 'srv-1', 'data': TICKET})
+    assert ack == {'job_id': 'srv-1', 'status': 'printed', 'seq': 1}
+
+    # Renvoi après une reconnexion : confirmé sans seconde impression
+    ack = send(qapp, server, {'job_id': 'srv-1', 'data': TICKET, 'seq': 1})
+    assert ack == {'job_id': 'srv-1', 'status': 'duplicate', 'seq': 1}
+    assert kiosk.printed == ['srv-1']
+
+
+def test_identical_tickets_without_id_are_both_printed(qapp, server, kiosk):
+    first = send(qapp, server, {'data': TICKET})
+    second = send(qapp, server, {'data': TICKET})
+    assert first['status'] == second['status'] == 'printed'
+    assert first['job_id'] != second['job_id']
+    assert len(kiosk.printed) == 2
+
+
+def test_unconfirmed_print_is_spooled(qapp, server, kiosk):
+    ack = send(qapp, server, {'job_id': 'slow-1', 'data': TICKET})
+    assert ack['status'] == 'spooled'
+    assert kiosk.printed == ['slow-1']
+
+
+def test_abandoned_ticket_is_acked_with_error(qapp, server, kiosk):
+    ack = send(qapp, server, {'job_id': 'bad-1', 'data': TICKET})
+    assert ack == {'job_id': 'bad-1', 'status': 'error', 'error': "ticket illisible", 'seq': 1}
+
+
+def test_invalid_seq_is_rejected(qapp, server, kiosk):
+    ack = send(qapp, server, {'job_id': 'srv-1', 'data': TICKET, 'seq': "3"})
+    assert ack == {'status': 'invalid'}
+    assert kiosk.printed == []
+
+
+def test_batch_statuses(qapp, server, kiosk):
+    send(qapp, server, {'job_id': 'srv-1', 'data': TICKET})
+    ack = send(qapp, server, {'jobs': [{'job_id': 'b-1', 'data': TICKET},
+                                       {'job_id': 'srv-1', 'data': TICKET},
+                                       {'job_id': 'slow-2', 'data': TICKET}]})
+    assert ack == {'seq': 2, 'status': 'batch', 'jobs': [
+        {'job_id': 'b-1', 'status': 'printed'},
+        {'job_id': 'srv-1', 'status': 'duplicate'},
+        {'job_id': 'slow-2', 'status': 'spooled'},
+    ]}
+    assert kiosk.printed == ['srv-1', 'b-1', 'slow-2']
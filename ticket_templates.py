@@ -0,0 +1,111 @@
+import codecs
+from datetime import datetime
+from logging_setup import get_logger
+from raster_cache import RasterCache
+
+logger = get_logger('print')
+
+
+# Commandes ESC/POS utilisées par les tickets
+ESC_INIT = b'\x1b@'
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+GS_SIZE_NORMAL = b'\x1d!\x00'
+GS_SIZE_DOUBLE = b'\x1d!\x11'
+GS_SIZE_TRIPLE = b'\x1d!\x22'
+FEED_AND_CUT = b'\n' * 4 + b'\x1dV\x00'
+
+# Table de caractères par défaut : PC858 (Europe de l'Ouest + €), n° 19 pour les TM-T88.
+# Le numéro dépend du modèle : préférences ticket_encoding et ticket_codepage
+DEFAULT_ENCODING = 'cp858'
+DEFAULT_CODEPAGE = 19
+
+
+class TicketTemplate:
+    """ Ticket dont les parties fixes (en-tête, pied, coupe) sont encodées une seule fois.
+    Seuls les champs variables (numéro, heure...) sont encodés à chaque ticket, puis le ticket
+    complet est envoyé à l'imprimante en une seule écriture.
+    Les images (logo, QR codes, codes-barres) passent par le cache de rastérisation """
+
+    def __init__(self, header_lines=(), footer_lines=(), encoding=DEFAULT_ENCODING,
+                 codepage=DEFAULT_CODEPAGE, logo_path=None, raster_cache=None):
+        try:
+            codecs.lookup(encoding)
+            select_codepage = b'\x1bt' + bytes([codepage])
+        except (LookupError, ValueError, TypeError):
+            logger.warning(f"Table de caractères invalide ({encoding}, n° {codepage}), "
+                           f"{DEFAULT_ENCODING} (n° {DEFAULT_CODEPAGE}) utilisée")
+            encoding, select_codepage = DEFAULT_ENCODING, b'\x1bt' + bytes([DEFAULT_CODEPAGE])
+        self.encoding = encoding
+        self.raster_cache = raster_cache or RasterCache()
+        self.text_prefix = select_codepage
+        self.prefix = b''.join([
+            ESC_INIT, select_codepage, ESC_ALIGN_CENTER,
+            self.logo(logo_path),
+            ESC_BOLD_ON, GS_SIZE_DOUBLE,
+            *(self.encode(line) + b'\n' for line in header_lines),
+            GS_SIZE_NORMAL, ESC_BOLD_OFF, b'\n',
+        ])
+        self.suffix = b''.join([
+            b'\n', ESC_ALIGN_CENTER,
+            *(self.encode(line) + b'\n' for line in footer_lines),
+            ESC_ALIGN_LEFT, FEED_AND_CUT,
+        ])
+
+    def logo(self, path):
+        if not path:
+            return b''
+        try:
+            return self.raster_cache.image(path) + b'\n'
+        except Exception as e:
+            # Ticket imprimé sans logo plutôt que pas de ticket
+            logger.warning(f"Logo {path} non imprimable : {e}")
+            return b''
+
+    def encode(self, text):
+        # Caractère absent de la table de l'imprimante : remplacé plutôt que de faire échouer le ticket
+        return text.encode(self.encoding, errors='replace')
+
+    def render(self, fields):
+        """ Ticket complet (bytes) à partir des champs variables :
+        number (imprimé en grand), time (heure actuelle par défaut), lines (lignes libres),
+        qr (texte ou lien du QR code), barcode (contenu d'un code-barres Code 128) """
+        parts = [self.prefix]
+        number = fields.get('number')
+        if number:
+            parts += [ESC_BOLD_ON, GS_SIZE_TRIPLE, self.encode(str(number)), b'\n',
+                      GS_SIZE_NORMAL, ESC_BOLD_OFF]
+        for line in fields.get('lines', ()):
+            parts += [self.encode(str(line)), b'\n']
+        ticket_time = fields.get('time') or datetime.now().strftime('%d/%m/%Y %H:%M')
+        parts += [self.encode(ticket_time), b'\n']
+        if fields.get('qr'):
+            parts += [ESC_ALIGN_CENTER, self.raster_cache.qr(str(fields['qr'])), b'\n']
+        if fields.get('barcode'):
+            parts += [ESC_ALIGN_CENTER, self.raster_cache.barcode(str(fields['barcode'])), b'\n']
+        parts.append(self.suffix)
+        return b''.join(parts)
+
+    def render_text(self, text):
+        """ Ticket texte libre (ancien format) : même envoi en une seule écriture """
+        return b''.join([self.text_prefix, self.encode(text), FEED_AND_CUT])
+
+
+class TicketTemplateEngine:
+    """ Modèles de tickets construits une fois et gardés en mémoire """
+
+    def __init__(self, header_lines=(), footer_lines=(), encoding=DEFAULT_ENCODING,
+                 codepage=DEFAULT_CODEPAGE, logo_path=None, raster_cache=None):
+        # Un seul cache pour tous les modèles : un même logo n'est rastérisé qu'une fois
+        self.raster_cache = raster_cache or RasterCache()
+        self.default = TicketTemplate(header_lines, footer_lines, encoding, codepage,
+                                      logo_path, self.raster_cache)
+        self.templates = {'default': self.default}
+
+    def add(self, name, template):
+        self.templates[name] = template
+
+    def get(self, name=None):
+        return self.templates.get(name or 'default', self.default)
@@ -0,0 +1,88 @@
+import json
+import time
+import bisect
+import threading
+from logging_setup import get_logger
+
+
+# Bornes (en secondes) de l'histogramme des intervalles entre deux appuis
+GAP_BUCKETS = (0.1, 0.5, 1, 5, 30, 300)
+TOUCH_TYPES = ('begin', 'update', 'end')
+
+
+class TouchTelemetry:
+    """ Télémétrie tactile à faible coût pour le thread de l'interface.
+    record() se contente d'incrémenter des compteurs ; un thread d'arrière-plan écrit périodiquement un résumé agrégé
+    (événements par seconde, histogramme des intervalles entre appuis) """
+
+    def __init__(self, flush_interval=60, logger=None):
+        self.flush_interval = flush_interval
+        self.logger = logger or get_logger('touch')
+        self.total = 0
+        self.last_touch = time.monotonic()
+        self._last_begin = None
+        self._lock = threading.Lock()
+        self._reset_interval()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.last_summary = None
+
+    def _reset_interval(self):
+        self.interval_start = time.monotonic()
+        self.counts = [0] * len(TOUCH_TYPES)
+        self.gaps = [0] * (len(GAP_BUCKETS) + 1)
+
+    def record(self, kind):
+        """ kind : 0 = début, 1 = mise à jour, 2 = fin de l'appui """
+        now = time.monotonic()
+        with self._lock:
+            self.total += 1
+            self.counts[kind] += 1
+            if kind == 0:
+                if self._last_begin is not None:
+                    # Intervalle égal à une borne : compté dans la classe suivante ("<borne" exclut la borne)
+                    self.gaps[bisect.bisect_right(GAP_BUCKETS, now - self._last_begin)] += 1
+                self._last_begin = now
+            self.last_touch = now
+
+    def seconds_since_last_touch(self):
+        return time.monotonic() - self.last_touch
+
+    def snapshot(self):
+        """ Résumé de l'intervalle écoulé, puis remise à zéro des compteurs """
+        with self._lock:
+            now = time.monotonic()
+            duration = max(now - self.interval_start, 1e-6)
+            counts, gaps = self.counts, self.gaps
+            self._reset_interval()
+            last_touch_age = now - self.last_touch
+        events = sum(counts)
+        labels = [f"<{b}s" for b in GAP_BUCKETS] + [f">={GAP_BUCKETS[-1]}s"]
+        return {
+            'interval': round(duration, 1),
+            'events': events,
+            'events_per_second': round(events / duration, 2),
+            'counts': dict(zip(TOUCH_TYPES, counts)),
+            'gaps': dict(zip(labels, gaps)),
+            'last_touch_age': round(last_touch_age, 1),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="touch-telemetry", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        summary = self.snapshot()
+        self.last_summary = summary
+        if summary['events']:
+            self.logger.info(f"Résumé tactile : {json.dumps(summary)}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.flush()
@@ -0,0 +1,97 @@
+import os
+from urllib.parse import urljoin
+from PySide6.QtCore import QObject, QStandardPaths, QUrl, Signal
+from PySide6.QtWebEngineCore import QWebEngineProfile, QWebEnginePage
+from kiosk_scripts import KIOSK_WORLD
+from logging_setup import get_logger
+
+logger = get_logger('web')
+
+CACHE_TYPES = {
+    'disk': QWebEngineProfile.HttpCacheType.DiskHttpCache,
+    'memory': QWebEngineProfile.HttpCacheType.MemoryHttpCache,
+    'none': QWebEngineProfile.HttpCacheType.NoCache,
+}
+
+
+def create_kiosk_profile(parent=None, cache_policy='disk', cache_size_mb=200):
+    """ Profil persistant de la borne : cache HTTP sur disque (les rechargements de /patient
+    sont servis localement) et cookies conservés entre deux lancements """
+    profile = QWebEngineProfile("kiosk", parent)  # profil nommé = stockage sur disque
+    base_path = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+    profile.setPersistentStoragePath(os.path.join(base_path, "webengine"))
+    profile.setCachePath(os.path.join(base_path, "webengine-cache"))
+    cache_type = CACHE_TYPES.get(cache_policy)
+    if cache_type is None:
+        logger.warning(f"Politique de cache inconnue : {cache_policy}, utilisation du cache disque")
+        cache_type = CACHE_TYPES['disk']
+    profile.setHttpCacheType(cache_type)
+    profile.setHttpCacheMaximumSize(int(cache_size_mb) * 1024 * 1024)
+    profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.AllowPersistentCookies)
+    logger.info(f"Profil web : cache {cache_policy} ({cache_size_mb} Mo) dans {profile.cachePath()}")
+    return profile
+
+
+# Ressources déclarées par la page mais pas encore chargées (préchargements, icônes, images
+# différées) : les autres sont déjà dans le cache, chargées avec la page elle-même
+PENDING_ASSETS_CALL = """
+(function() {
+    const loaded = new Set(performance.getEntriesByType('resource').map(e => e.name));
+    const urls = [];
+    document.querySelectorAll('script[src], img[src]').forEach(e => urls.push(e.src));
+    document.querySelectorAll('link[href]').forEach(e => {
+        if (['stylesheet', 'preload', 'prefetch', 'icon'].includes(e.rel)) urls.push(e.href);
+    });
+    return [...new Set(urls)].filter(url => url.startsWith('http') && !loaded.has(url));
+})()
+"""
+
+
+class AssetPrefetcher(QObject):
+    """ Préchauffage du cache : la page est chargée une fois dans une page invisible du même
+    profil (mêmes cookies : la borne connectée obtient bien /patient et non la page de connexion),
+    puis ses ressources restantes et d'éventuelles URL supplémentaires """
+    finished = Signal(int)  # nombre de ressources chargées
+
+    def __init__(self, profile, page_url, extra_urls=()):
+        super().__init__()
+        self.profile = profile
+        self.page_url = page_url
+        self.extra_urls = list(extra_urls)
+        self.urls = []
+        self.loaded = 0
+        self.page = None
+
+    def start(self):
+        self.page = QWebEnginePage(self.profile, self)
+        self.page.loadFinished.connect(self._on_page_loaded)
+        self.page.setUrl(QUrl(self.page_url))
+
+    def _on_page_loaded(self, ok):
+        self.page.loadFinished.disconnect(self._on_page_loaded)
+        if not ok:
+            logger.warning(f"Préchauffage du cache : chargement de {self.page_url} impossible")
+            self._on_assets_found([])
+            return
+        self.loaded += 1
+        self.page.runJavaScript(PENDING_ASSETS_CALL, KIOSK_WORLD, self._on_assets_found)
+
+    def _on_assets_found(self, urls):
+        self.urls = [url for url in (urls or []) if isinstance(url, str)]
+        self.urls += [urljoin(self.page_url, url) for url in self.extra_urls]
+        self.page.loadFinished.connect(self._on_load_finished)
+        self._load_next()
+
+    def _on_load_finished(self, ok):
+        if ok:
+            self.loaded += 1
+        self._load_next()
+
+    def _load_next(self):
+        if not self.urls:
+            logger.info(f"Préchauffage du cache terminé : {self.loaded} ressource(s)")
+            self.page.deleteLater()
+            self.page = None
+            self.finished.emit(self.loaded)
+            return
+        self.page.setUrl(QUrl(self.urls.pop(0)))
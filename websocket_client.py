@@ -1,101 +1,325 @@
 import socketio
+import asyncio
+import random
 import json
-import time
 from PySide6.QtCore import Signal, QThread
+from print_spool import JobIdIndex, job_from_message, new_job_id
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger('socket')
+
+CONNECTS = registry.counter('kiosk_socket_connects_total', "Connexions WebSocket établies")
+RECONNECT_ATTEMPTS = registry.counter('kiosk_socket_reconnect_attempts_total',
+                                      "Tentatives de reconnexion WebSocket")
+PING_RTT = registry.gauge('kiosk_socket_ping_rtt_seconds', "Aller-retour du dernier ping applicatif")
 
 
 class WebSocketClient(QThread):
-    signal_print = Signal(str)
+    """ Client Socket.IO asynchrone : une boucle asyncio dans un thread dédié.
+    En cas de coupure, la reconnexion se fait avec un délai exponentiel et aléatoire
+    (jitter) pour éviter que toutes les bornes se reconnectent en même temps """
+    signal_print = Signal(object, str)  # ticket (texte base64 ou modèle + champs), identifiant du travail
+    signal_print_batch = Signal(list)  # [(ticket, identifiant)] à imprimer en une fois
+    connected = Signal()
+    connection_state_changed = Signal(str)  # 'connecting', 'connected', 'disconnected', 'stopped'
 
-    def __init__(self, web_url):
+    def __init__(self, web_url, namespace='/socket_app_patient', backoff_base=1, backoff_max=60,
+                 connect_timeout=10, ack_timeout=60, max_processed_ids=500, ping_interval=30, token=None,
+                 capabilities=None):
         super().__init__()
+        self.token = token  # envoyé à chaque connexion : un nouveau token sert dès la suivante
+        # Annoncées au serveur à la connexion : il choisit le format des tickets pour cette borne
+        self.capabilities = capabilities or {'raw': False, 'batch': True, 'templates': True}
         if "https" in web_url:
             self.web_url = web_url.replace("https", "wss")
         else:
             self.web_url = web_url.replace("http", "ws")
 
-        self._should_run = True
-        self._is_connected = False
-        
-        # Configuration du client avec reconnexion désactivée par défaut
-        self.sio = socketio.Client(
-            logger=True,
-            engineio_logger=True,
-            reconnection=False  # Désactive la reconnexion automatique
+        self.namespace = namespace
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.state = 'disconnected'
+        self.loop = None
+        self._stop_requested = False
+        self._stop_event = None
+        self._disconnected = None
+        # Livraison "au moins une fois" : accusé de réception après impression,
+        # et les tickets déjà traités sont ignorés s'ils sont renvoyés
+        self.ack_timeout = ack_timeout
+        self.processed_ids = JobIdIndex(max_processed_ids)
+        self.last_seq = None
+        self._pending_acks = {}  # job_id -> asyncio.Future
+        # Ping applicatif (événement 'ping_rtt' avec accusé de réception) pour mesurer l'aller-retour ;
+        # désactivé si le serveur n'y répond pas
+        self.ping_interval = ping_interval
+        self._ping_supported = True
+
+        # Reconnexion gérée par run() (délai exponentiel), pas par la librairie.
+        # Pas de journalisation des paquets (PING/PONG) : seuls les avertissements remontent
+        self.sio = socketio.AsyncClient(
+            logger=False,
+            engineio_logger=False,
+            reconnection=False
         )
 
         # Connexion aux événements WebSocket
-        self.sio.on('connect', self.on_connect, namespace='/socket_app_patient')
-        self.sio.on('disconnect', self.on_disconnect, namespace='/socket_app_patient')
-        self.sio.on('update', self.on_update, namespace='/socket_app_patient')
+        self.sio.on('connect', self.on_connect, namespace=self.namespace)
+        self.sio.on('disconnect', self.on_disconnect, namespace=self.namespace)
+        self.sio.on('update', self.on_update, namespace=self.namespace)
 
     def run(self):
-        self._should_run = True
-        while self._should_run:
-            try:
-                if not self._is_connected:
-                    self.sio.connect(
-                        self.web_url,
-                        namespaces=['/socket_app_patient'],
-                        wait_timeout=10,
-                        transports=['websocket']  # Force l'utilisation de WebSocket uniquement
-                    )
-                    self._is_connected = True
-                
-                # Attendre tant que la connexion est active
-                while self._is_connected and self._should_run:
-                    self.sio.sleep(1)
-                
-                # Si on sort de la boucle et qu'on ne devrait plus tourner, on sort
-                if not self._should_run:
-                    break
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+            self.loop = None
 
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.connection_state_changed.emit(state)
+
+    def backoff_delay(self, attempt):
+        """ Délai avant la tentative suivante : exponentiel, plafonné, avec une part aléatoire """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _main(self):
+        self._stop_event = asyncio.Event()
+        self._disconnected = asyncio.Event()
+        attempt = 0
+        ping_task = asyncio.ensure_future(self._ping_loop())
+        while not self._stop_requested:
+            self._set_state('connecting')
+            if attempt:
+                RECONNECT_ATTEMPTS.inc()
+            try:
+                self._disconnected.clear()
+                await self.sio.connect(
+                    self.web_url,
+                    namespaces=[self.namespace],
+                    # Le serveur peut renvoyer les messages postérieurs au dernier numéro reçu
+                    auth=self._auth(),
+                    wait_timeout=self.connect_timeout,
+                    transports=['websocket']  # Force l'utilisation de WebSocket uniquement
+                )
+                attempt = 0
+                # Attendre la déconnexion ou une demande d'arrêt
+                await self._wait_first(self._stop_event.wait(), self._disconnected.wait())
             except socketio.exceptions.ConnectionError as e:
-                print(f"Erreur de connexion: {e}")
-                if not self._should_run:
-                    break
-                time.sleep(5)
+                logger.warning(f"Erreur de connexion: {e}")
             except Exception as e:
-                print(f"Erreur inattendue: {e}")
+                # Une erreur inattendue ne doit plus arrêter définitivement le client
+                logger.exception(f"Erreur inattendue: {e}")
+
+            await self._cleanup()
+            if self._stop_requested:
                 break
-        
-        # Nettoyage final
-        self._cleanup()
-
-    def stop(self):
-        """Arrête proprement le client WebSocket"""
-        print("Arrêt du client WebSocket...")
-        self._should_run = False
-        self._is_connected = False
-        self._cleanup()
-        self.quit()
-        self.wait()
-        print("Client WebSocket arrêté")
-
-    def _cleanup(self):
+            self._set_state('disconnected')
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            logger.info(f"Nouvelle tentative de connexion dans {delay:.1f} s")
+            await self._wait_first(self._stop_event.wait(), asyncio.sleep(delay))
+
+        ping_task.cancel()
+        await self._cancel_pending()
+        self._set_state('stopped')
+
+    async def _cancel_pending(self):
+        """ Libère les accusés de réception en attente et termine les tâches restantes
+        avant la fermeture de la boucle (tickets conservés dans le journal d'impression) """
+        for future in self._pending_acks.values():
+            future.cancel()
+        self._pending_acks.clear()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _auth(self):
+        auth = {'last_seq': self.last_seq, 'capabilities': self.capabilities}
+        if self.token:
+            auth['token'] = self.token
+        return auth
+
+    async def _ping_loop(self):
+        while self._ping_supported:
+            await asyncio.sleep(self.ping_interval)
+            if not self.sio.connected:
+                continue
+            start = self.loop.time()
+            try:
+                await self.sio.call('ping_rtt', namespace=self.namespace, timeout=5)
+            except socketio.exceptions.TimeoutError:
+                logger.debug("Le serveur ne répond pas au ping applicatif, mesure désactivée")
+                self._ping_supported = False
+            except Exception as e:
+                logger.debug(f"Ping applicatif impossible : {e}")
+            else:
+                PING_RTT.set(round(self.loop.time() - start, 4))
+
+    async def _wait_first(self, *coroutines):
+        tasks = [asyncio.ensure_future(c) for c in coroutines]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stop(self, timeout_ms=3000):
+        """ Arrête le client WebSocket (appelé depuis le thread de l'interface : attente bornée).
+        Retourne False si le thread ne s'est pas terminé à temps """
+        logger.info("Arrêt du client WebSocket...")
+        self._stop_requested = True
+        loop = self.loop
+        if loop is not None and self._stop_event is not None:
+            try:
+                loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                pass  # boucle déjà fermée
+        if not self.wait(timeout_ms):
+            return False
+        logger.info("Client WebSocket arrêté")
+        return True
+
+    async def _cleanup(self):
         """Nettoyage des ressources"""
         try:
-            if hasattr(self, 'sio') and self.sio.connected:
-                self.sio.disconnect()
+            if self.sio.connected:
+                await self.sio.disconnect()
         except Exception as e:
-            print(f"Erreur lors du nettoyage: {e}")
+            logger.warning(f"Erreur lors du nettoyage: {e}")
+
+    async def on_connect(self):
+        logger.info('WebSocket connecté')
+        CONNECTS.inc()
+        self._set_state('connected')
+        self.connected.emit()
 
-    def on_connect(self):
-        print('WebSocket connecté')
-        self._is_connected = True
+    async def on_disconnect(self):
+        logger.info('WebSocket déconnecté')
+        if self._disconnected is not None:
+            self._disconnected.set()
+
+    def acknowledge(self, job_id, success, error=None):
+        """ Résultat d'impression (appelé depuis le thread de l'interface).
+        Un succès ou un abandon (error) libère l'accusé de réception ; un simple échec non :
+        le ticket reste dans le journal d'impression et sera rejoué """
+        loop = self.loop
+        if loop is None or not (success or error):
+            return
+        result = {'status': 'printed'} if success else {'status': 'error', 'error': error}
+        try:
+            loop.call_soon_threadsafe(self._resolve_ack, job_id, result)
+        except RuntimeError:
+            pass  # boucle déjà fermée
 
-    def on_disconnect(self):
-        print('WebSocket déconnecté')
-        self._is_connected = False
-        if not self._should_run:
-            self.quit()
+    def _resolve_ack(self, job_id, result):
+        self.processed_ids.add(job_id)
+        future = self._pending_acks.pop(job_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
 
-    def on_update(self, data):
+    def _check_seq(self, seq):
+        if seq is None:
+            return
+        if self.last_seq is not None and seq > self.last_seq + 1:
+            logger.warning(f"Messages manquants : séquence {self.last_seq + 1} à {seq - 1}")
+        if self.last_seq is None or seq > self.last_seq:
+            self.last_seq = seq
+
+    def _decode_message(self, data):
+        """ Message 'update' : dictionnaire (JSON ou pièces jointes binaires Socket.IO),
+        texte JSON (ancien format, parfois encodé deux fois) ou trame msgpack (bytes) """
+        if isinstance(data, (bytes, bytearray)):
+            try:
+                import msgpack
+            except ImportError:
+                logger.error("Trame msgpack reçue mais le module msgpack n'est pas installé")
+                return None
+            try:
+                return msgpack.unpackb(data, raw=False)
+            except Exception as e:
+                logger.error(f"Erreur de décodage msgpack: {e}")
+                return None
         try:
-            if isinstance(data, str):
+            while isinstance(data, str):
                 data = json.loads(data)
-            print(f"Mise à jour reçue: {data}")
-            if data.get('flag') == 'print':
-                self.signal_print.emit(data['data'])
         except json.JSONDecodeError as e:
-            print(f"Erreur de décodage JSON: {e}")
\ No newline at end of file
+            logger.error(f"Erreur de décodage JSON: {e}")
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _job(self, message):
+        payload, job_id = job_from_message(message, raw_enabled=self.capabilities.get('raw', False))
+        # Sans identifiant serveur, pas de détection des doublons : le ticket est toujours imprimé
+        return payload, job_id or new_job_id()
+
+    async def on_update(self, data):
+        """ Le retour de ce gestionnaire est l'accusé de réception envoyé au serveur.
+        Un message peut contenir un seul ticket ou un lot ('jobs'), imprimé en une fois """
+        data = self._decode_message(data)
+        if data is None:
+            return {'status': 'invalid'}
+        if data.get('flag') != 'print':
+            return None
+        seq = data.get('seq')
+        if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int)):
+            logger.error(f"Numéro de séquence invalide : {seq!r}")
+            return {'status': 'invalid'}
+        self._check_seq(seq)
+        try:
+            if 'jobs' in data:
+                jobs = [self._job(job) for job in data['jobs']]
+            else:
+                jobs = [self._job(data)]
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            logger.error(f"Ticket mal formé: {e}")
+            return {'seq': seq, 'status': 'invalid'}
+        logger.debug(f"{len(jobs)} ticket(s) reçu(s), séquence {seq}")
+
+        statuses = await self._print_jobs(jobs)
+        if 'jobs' in data:
+            return {'seq': seq, 'status': 'batch', 'jobs': statuses}
+        return dict(statuses[0], seq=seq)
+
+    async def _print_jobs(self, jobs):
+        statuses = {}
+        new, waits = [], []
+        for payload, job_id in jobs:
+            if job_id in self.processed_ids:
+                logger.info(f"Ticket {job_id} déjà imprimé, renvoi ignoré")
+                self.processed_ids.add(job_id)
+                statuses[job_id] = {'status': 'duplicate'}
+                continue
+            future = self._pending_acks.get(job_id)
+            if future is None:
+                future = self.loop.create_future()
+                self._pending_acks[job_id] = future
+                new.append((payload, job_id))
+            waits.append((job_id, future))
+
+        if len(new) == 1:
+            self.signal_print.emit(*new[0])
+        elif new:
+            self.signal_print_batch.emit(new)
+
+        if waits:
+            shields = [asyncio.shield(future) for _, future in waits]
+            try:
+                await asyncio.wait(shields, timeout=self.ack_timeout)
+            finally:
+                # Attentes restées en cours après le délai : annulées (pas l'accusé lui-même)
+                for shield in shields:
+                    shield.cancel()
+            for job_id, future in waits:
+                if future.done() and not future.cancelled():
+                    statuses[job_id] = future.result()
+                else:
+                    # Ticket non confirmé à temps : conservé dans le journal d'impression de la borne
+                    statuses[job_id] = {'status': 'spooled'}
+        return [dict(statuses[job_id], job_id=job_id) for _, job_id in jobs]